@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mountains.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +83,45 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# File-based so that all worker processes on the box share the catalog version key.
+# Kept in the (git-ignored) .django_cache/ of the project unless DJANGO_CACHE_DIR is set.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', BASE_DIR / '.django_cache'),
+    }
+}
+
+# Sessions are read through the cache (and still persisted in the DB), so a cached
+# profile page needs no session query.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Background jobs (mountains/jobs.py), processed by `python manage.py run_worker`
+
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 3
+
+
+# Threads for the CPU-bound image work of the async upload view (mountains/offload.py):
+# at most this many uploads are parsed, hashed or written at the same time
+
+IMAGE_WORK_THREADS = 4
+
+
+# Instrumentation (mountains/metrics.py): requests slower than this many seconds are
+# logged with their per-stage breakdown (None disables the log). /metrics is served
+# to staff users and to the addresses in the comma-separated METRICS_ALLOWED_IPS
+# environment variable (none by default: behind a local reverse proxy every request
+# comes from 127.0.0.1, so allowing localhost would make the endpoint public).
+
+SLOW_REQUEST_SECONDS = 1.0
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -120,4 +161,10 @@ STATIC_URL = 'static/'
 import os
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Atomic writes and content-addressed photo names (mountains/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'mountains.storage.ShardedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
@@ -1,20 +1,94 @@
 # mountains/admin.py
+import datetime
+
 from django.contrib import admin
-from .models import Mountain, Photo, Badge
+from django.db.models import QuerySet
+from django.utils import timezone
+from .models import Mountain, Photo, Badge, Job, Track
+from .pagination import EstimatedCountPaginator
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    QuerySet whose datetimes() finds each year/month/day with one index probe (the
+    first row at or after the period's start) instead of a DISTINCT over every row.
+    The admin date hierarchy lists its choices through it, so even the top-level
+    year list of a huge table costs a handful of indexed reads.
+    """
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day') or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        rows = self.order_by(field_name).values_list(field_name, flat=True)
+        periods = []
+        moment = rows.first()
+        while moment is not None:
+            # Periods start at local midnight, like the ones datetimes() truncates to
+            if timezone.is_aware(moment):
+                moment = timezone.localtime(moment)
+            start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+            if kind == 'day':
+                end = start + datetime.timedelta(days=1)
+            elif kind == 'month':
+                start = start.replace(day=1)
+                end = (start + datetime.timedelta(days=32)).replace(day=1)
+            else:
+                start = start.replace(month=1, day=1)
+                end = start.replace(year=start.year + 1)
+            periods.append(start)
+            moment = rows.filter(**{f'{field_name}__gte': end}).first()
+        return periods if order == 'ASC' else periods[::-1]
 
 @admin.register(Mountain)
 class MountainAdmin(admin.ModelAdmin):
     # Columns displayed in the list view of Mountains
     list_display = ('name', 'altitude', 'latitude', 'longitude')
+    # Also what the autocomplete widgets (badges, photos) search by
+    search_fields = ('name', '=external_id')
+    ordering = ('name', 'id')
 
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
-    # Uses a specialized JavaScript widget for ManyToMany fields
-    # This makes selecting multiple mountains for a badge much easier than a standard multi-select box
-    filter_horizontal = ('mountains',) 
+    # Mountains are picked with a search-as-you-type widget that loads matches on demand.
+    # (filter_horizontal rendered the whole catalog into every badge page.)
+    autocomplete_fields = ('mountains',)
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
     # Display the user, the auto-detected mountain, and upload timestamp
-    list_display = ('user', 'matched_mountain', 'latitude', 'uploaded_at')
\ No newline at end of file
+    list_display = ('user', 'matched_mountain', 'status', 'latitude', 'uploaded_at')
+    # Users and mountains come from the same query as the photos (one JOIN, not one query per row)
+    list_select_related = ('user', 'matched_mountain')
+    # Filters, drill-down and ordering are all served by the Photo indexes
+    list_filter = ('status',)
+    date_hierarchy = 'uploaded_at'
+    ordering = ('-uploaded_at', '-id')
+    # Exact username match: an index lookup instead of a scan with LIKE
+    search_fields = ('=user__username',)
+    search_help_text = "Exact username"
+    # No COUNT(*) over the whole table on every page view (see EstimatedCountPaginator)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('user', 'matched_mountain')
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # date_hierarchy reads its choices through datetimes(); see IndexedDatesQuerySet
+        return IndexedDatesQuerySet(queryset.model, queryset.query, using=queryset.db)
+
+@admin.register(Track)
+class TrackAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'point_count', 'uploaded_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('user',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    # Background queue: useful to inspect failed jobs and their tracebacks
+    list_display = ('task', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'task')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
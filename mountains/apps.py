@@ -0,0 +1,21 @@
+# mountains/apps.py
+from django.apps import AppConfig
+
+
+class MountainsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'mountains'
+
+    def ready(self):
+        # Registers the signal handlers that keep the catalog cache in sync
+        from . import signals  # noqa: F401
+
+        # Pillow cannot decode HEIC (iPhone photos) by itself. With pillow-heif the
+        # upload form's ImageField and the renditions open them like any other
+        # image; without it such files are refused as invalid images.
+        try:
+            from pillow_heif import register_heif_opener
+        except ImportError:
+            pass
+        else:
+            register_heif_opener()
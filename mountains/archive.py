@@ -0,0 +1,116 @@
+# mountains/archive.py
+# Reading side of `import_photos`: walks a photo archive (a directory tree or a ZIP
+# file) and processes its entries in ProcessPoolExecutor workers. Like utils.py,
+# this module doesn't touch the ORM, so workers start under any start method.
+import hashlib
+import os
+import uuid
+import zipfile
+
+from .exif import sniff_format
+from .utils import get_exif_data
+
+CHUNK_SIZE = 64 * 1024
+
+# Archive entries skipped without being read (OS metadata, hidden files)
+IGNORED_PARTS = {'__MACOSX', '.DS_Store', 'Thumbs.db', 'desktop.ini'}
+
+# Rejection reasons written to the import report
+UNSUPPORTED_FILE = "not a JPEG, PNG, WebP or HEIC image"
+UNREADABLE_FILE = "could not be read: {error}"
+
+# Archive and staging directory of a worker process, set once by init_archive_worker()
+_worker_source = None
+_worker_zip = None
+_worker_staging = None
+
+
+def is_zip(path):
+    return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+
+def ignored(name):
+    return any(part in IGNORED_PARTS or part.startswith('.') for part in name.split('/'))
+
+
+def iter_archive(path):
+    """
+    Yields the names of the files in a directory tree (relative, with forward
+    slashes) or a ZIP archive, lazily and in a stable order.
+    """
+    if is_zip(path):
+        with zipfile.ZipFile(path) as archive:
+            # infolist() comes from the central directory at the end of the file;
+            # only the entry metadata is held, never the contents
+            for info in archive.infolist():
+                if not info.is_dir() and not ignored(info.filename):
+                    yield info.filename
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), path).replace(os.sep, '/')
+            if not ignored(name):
+                yield name
+
+
+def init_archive_worker(source, staging_dir):
+    """
+    ProcessPoolExecutor initializer: every worker opens the archive once.
+    """
+    global _worker_source, _worker_zip, _worker_staging
+    _worker_source = source
+    _worker_zip = zipfile.ZipFile(source) if is_zip(source) else None
+    _worker_staging = staging_dir
+    os.makedirs(staging_dir, exist_ok=True)
+
+
+def open_entry(name):
+    if _worker_zip is not None:
+        return _worker_zip.open(name)
+    return open(os.path.join(_worker_source, name), 'rb')
+
+
+def stage_entry(name):
+    """
+    Copies one archive entry into the staging directory, hashing it on the way,
+    then reads its GPS position from the header of the staged copy.
+    The archive is read exactly once per entry; the staged file is later renamed
+    into storage as it is. Returns a dict with name, size, content_hash, staged
+    (path), latitude and longitude, or with name and error.
+    """
+    staged = os.path.join(_worker_staging, f".tmp-{uuid.uuid4().hex}")
+    result = {'name': name}
+    try:
+        with open_entry(name) as src:
+            chunk = src.read(CHUNK_SIZE)
+            if sniff_format(chunk) is None:
+                result['error'] = UNSUPPORTED_FILE
+                return result
+            digest = hashlib.sha256()
+            size = 0
+            with open(staged, 'wb') as out:
+                while chunk:
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                    chunk = src.read(CHUNK_SIZE)
+        with open(staged, 'rb') as f:
+            lat, lon = get_exif_data(f)
+        result.update(size=size, content_hash=digest.hexdigest(), staged=staged, latitude=lat, longitude=lon)
+        return result
+    except (OSError, zipfile.BadZipFile, EOFError) as e:
+        result['error'] = UNREADABLE_FILE.format(error=e)
+        return result
+    finally:
+        # Only a successfully staged file is handed over to the parent process
+        if 'staged' not in result and os.path.exists(staged):
+            os.remove(staged)
+
+
+def stage_entries(names):
+    """
+    Runs in a worker: [entry name, ...] -> [stage_entry() result, ...]
+    """
+    return [stage_entry(name) for name in names]
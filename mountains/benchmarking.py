@@ -0,0 +1,117 @@
+# mountains/benchmarking.py
+import io
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+# Synthetic peaks are spread over this box (roughly Central Europe)
+LAT_RANGE = (45.0, 55.0)
+LON_RANGE = (10.0, 30.0)
+
+
+def synthetic_catalog(size, rng):
+    """
+    Builds an in-memory catalog of `size` fake peaks spread over Central Europe.
+    Plain namespaces are used so the benchmark measures matching, not the ORM.
+    """
+    return [
+        SimpleNamespace(
+            id=i,
+            latitude=rng.uniform(*LAT_RANGE),
+            longitude=rng.uniform(*LON_RANGE),
+            radius=rng.choice((100, 200, 300, 500)),
+        )
+        for i in range(size)
+    ]
+
+
+def phone_sized_jpeg(width, height, lat=49.1795, lon=20.0881):
+    """
+    Encodes a noisy JPEG (noise compresses badly, like real photos) with GPS EXIF and
+    a handful of the usual camera tags, returning its bytes.
+    """
+    exif = Image.Exif()
+    exif[0x010F] = 'BenchCam'            # Make
+    exif[0x0110] = 'Model X'             # Model
+    exif[0x0132] = '2026:01:10 12:00:00' # DateTime
+    gps = exif.get_ifd(0x8825)
+    gps[1], gps[3] = ('N' if lat >= 0 else 'S'), ('E' if lon >= 0 else 'W')
+    lat, lon = abs(lat), abs(lon)
+    gps[2] = (int(lat), int(lat * 60) % 60, round((lat * 3600) % 60, 4))
+    gps[4] = (int(lon), int(lon * 60) % 60, round((lon * 3600) % 60, 4))
+
+    img = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=90, exif=exif)
+    return out.getvalue()
+
+
+def summarize(samples, queries=None):
+    """
+    Latency percentiles (milliseconds) of a list of durations in seconds,
+    plus the query count per call when it was measured.
+    """
+    ms = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    result = {'calls': len(ms), 'p50_ms': round(cuts[49], 4), 'p95_ms': round(cuts[94], 4),
+              'p99_ms': round(cuts[98], 4), 'max_ms': round(ms[-1], 4)}
+    if queries is not None:
+        result['queries'] = max(queries)
+    return result
+
+
+def measure(func, args_list, count_queries=False):
+    """
+    Calls func(*args) for every entry of args_list and summarizes the latencies.
+    With count_queries the highest number of SQL queries of a single call is kept too.
+    """
+    samples, queries = [], []
+    for args in args_list:
+        if count_queries:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                func(*args)
+                samples.append(time.perf_counter() - start)
+            queries.append(len(captured.captured_queries))
+        else:
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples, queries if count_queries else None)
+
+
+def load_baseline(path):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def save_baseline(path, results, parameters):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'parameters': parameters, 'results': results}, indent=2, sort_keys=True) + '\n')
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regression messages. A benchmark regresses when its p50 or
+    p95 exceeds the baseline times `tolerance`, or when it runs more queries at all
+    (query counts are deterministic, so any increase is a real change).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if current[key] > previous[key] * tolerance:
+                regressions.append(f"{name}: {key} {current[key]:.3f} > {previous[key]:.3f} x {tolerance}")
+        if current.get('queries', 0) > previous.get('queries', current.get('queries', 0)):
+            regressions.append(f"{name}: {current['queries']} queries > {previous['queries']}")
+    return regressions
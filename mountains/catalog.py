@@ -0,0 +1,169 @@
+# mountains/catalog.py
+import threading
+import uuid
+from collections import namedtuple
+from functools import cached_property
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import Mountain, Badge
+from .spatial import MountainIndex, NearestIndex, mountain_arrays
+
+# Shared cache key holding the current catalog version.
+# Every worker process compares it with the version of its local snapshot,
+# so an admin edit in one worker makes all the others reload.
+CATALOG_VERSION_KEY = 'mountains:catalog-version'
+
+# Compact, immutable rows. They expose the same attribute names as the models,
+# so they can be passed to check_proximity() and rendered by the templates.
+MountainRecord = namedtuple('MountainRecord', 'id name latitude longitude altitude radius')
+
+
+class BadgeRecord(namedtuple('BadgeRecord', 'id name description icon mountain_ids')):
+    __slots__ = ()
+
+    @property
+    def icon_url(self):
+        # Badge.icon uses the default storage, so the URL can be built from the stored name.
+        return default_storage.url(self.icon) if self.icon else ''
+
+
+class BadgeRequirementIndex:
+    """
+    Required mountains of every badge as a bitset over a dense mountain numbering
+    (position in the catalog). A user's progress on all badges is then one AND
+    and one popcount per badge, without touching the database.
+    """
+
+    def __init__(self, mountains, badges):
+        self.position = {m.id: i for i, m in enumerate(mountains)}
+        self.size = len(mountains)
+        self.entries = tuple((badge, self.mask(badge.mountain_ids)) for badge in badges)
+
+    def mask(self, mountain_ids):
+        """
+        Bitset with the bits of the given mountains set (unknown ids are ignored).
+        """
+        # Setting bits in a bytearray avoids re-allocating a growing int for every member
+        bits = bytearray((self.size + 7) // 8)
+        for mountain_id in mountain_ids:
+            pos = self.position.get(mountain_id)
+            if pos is not None:
+                bits[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(bits, 'little')
+
+    def progress(self, visited_ids):
+        """
+        Returns [(badge, visited_count, total_required), ...] for all badges in one pass.
+        """
+        visited = self.mask(visited_ids)
+        return [(badge, (required & visited).bit_count(), required.bit_count())
+                for badge, required in self.entries]
+
+
+class Catalog:
+    """
+    Read-only, process-local snapshot of all mountains and badges.
+    Built once per catalog version and shared by the upload and profile paths.
+    """
+
+    def __init__(self, version, mountains, badges):
+        self.version = version
+        self.mountains = mountains
+        self.mountains_by_id = {m.id: m for m in mountains}
+        self.badges = badges
+        self.index = MountainIndex(mountains)
+
+    def __len__(self):
+        return len(self.mountains)
+
+    @cached_property
+    def badges_by_mountain(self):
+        # Reverse map: mountain id -> badges that require it
+        reverse = {}
+        for badge in self.badges:
+            for mountain_id in badge.mountain_ids:
+                reverse.setdefault(mountain_id, []).append(badge)
+        return {mountain_id: tuple(badges) for mountain_id, badges in reverse.items()}
+
+    @cached_property
+    def badge_index(self):
+        # Built once per catalog version, on first use
+        return BadgeRequirementIndex(self.mountains, self.badges)
+
+    @cached_property
+    def arrays(self):
+        # Only built when a batch matcher needs it
+        return mountain_arrays(self.mountains)
+
+    @cached_property
+    def nearest(self):
+        # k-nearest lookups for rejection messages, built on the first rejection
+        return NearestIndex(self.mountains, self.arrays)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_catalog_version():
+    """
+    Returns the shared catalog version, creating one if the cache has none yet.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # add() is a no-op if another worker set it first; re-read to agree on one value.
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Marks every worker's snapshot as stale. Called by the model signals.
+    """
+    global _snapshot
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+    _snapshot = None
+
+
+def load_catalog(version):
+    """
+    Reads the whole catalog with three flat queries (no model instances).
+    """
+    mountains = tuple(
+        MountainRecord(*row) for row in Mountain.objects.order_by('id').values_list(
+            'id', 'name', 'latitude', 'longitude', 'altitude', 'radius'
+        )
+    )
+
+    memberships = {}
+    for badge_id, mountain_id in Badge.mountains.through.objects.values_list('badge_id', 'mountain_id'):
+        memberships.setdefault(badge_id, set()).add(mountain_id)
+
+    badges = tuple(
+        BadgeRecord(badge_id, name, description, icon, frozenset(memberships.get(badge_id, ())))
+        for badge_id, name, description, icon in Badge.objects.order_by('id').values_list(
+            'id', 'name', 'description', 'icon'
+        )
+    )
+
+    return Catalog(version, mountains, badges)
+
+
+def get_catalog():
+    """
+    Returns the current catalog snapshot, reloading it only when the shared version changed.
+    """
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        # Another thread may have reloaded while we were waiting for the lock.
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = load_catalog(version)
+        return _snapshot
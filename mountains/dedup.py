@@ -0,0 +1,29 @@
+# mountains/dedup.py
+from .models import Photo
+
+
+# A rejected earlier copy does not make a re-upload redundant: the catalog may have
+# gained its mountain since, so the new upload is verified again
+COUNTED_STATUSES = (Photo.Status.PENDING, Photo.Status.VERIFIED)
+
+
+async def afind_own_duplicate(user, content_hash):
+    """
+    The user's earlier upload of the very same file that is verified or still
+    waiting for verification, if any.
+    """
+    return await (
+        Photo.objects.filter(user=user, content_hash=content_hash, status__in=COUNTED_STATUSES)
+        .order_by('id').afirst()
+    )
+
+
+async def afind_shared_blob(content_hash):
+    """
+    Stored file names (image, thumbnail, preview) of any earlier upload of the same
+    file, so another user's copy can reference them instead of storing them again.
+    """
+    return await (
+        Photo.objects.filter(content_hash=content_hash).exclude(image='')
+        .order_by('id').values('image', 'thumbnail', 'preview').afirst()
+    )
@@ -0,0 +1,370 @@
+# mountains/exif.py
+# Minimal EXIF GPS reader.
+# Instead of decoding the image with Pillow, we walk only the container structure
+# of the file (JPEG segments, PNG/WebP chunks or HEIF boxes) until the
+# EXIF/TIFF block is found, then jump straight from IFD0 to the GPS IFD.
+# Parsing works on a memoryview with struct.unpack_from, so nothing is copied
+# and pixel data is never read.
+import struct
+
+# How much of the file is read up front. The JPEG EXIF segment (APP1) normally
+# follows the start marker directly, and the GPS IFD sits in its first few KB
+# (the embedded thumbnail, which makes APP1 large, comes after it).
+HEAD_SIZE = 16 * 1024
+# Upper bound when large segments (ICC profiles, XMP) push EXIF further down.
+MAX_HEAD_SIZE = 1024 * 1024
+
+# TIFF tag in IFD0 pointing to the GPS IFD
+GPS_IFD_POINTER = 0x8825
+# Only the GPS tags needed to compute coordinates are decoded
+GPS_TAGS = {
+    1: 'GPSLatitudeRef',
+    2: 'GPSLatitude',
+    3: 'GPSLongitudeRef',
+    4: 'GPSLongitude',
+}
+ASCII, RATIONAL, SRATIONAL = 2, 5, 10
+# Byte size of one value for every TIFF field type
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+JPEG_SIGNATURE = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+HEIF_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif'}
+
+
+class Truncated(Exception):
+    """
+    The buffer ends before the EXIF block could be located; more bytes are needed.
+    """
+
+
+class ExifAt(Exception):
+    """
+    The EXIF block lives elsewhere in the file (HEIF stores it as an item in 'mdat').
+    """
+    def __init__(self, offset, length):
+        super().__init__(offset, length)
+        self.offset = offset
+        self.length = length
+
+
+def sniff_format(buf):
+    """
+    Returns 'jpeg', 'png', 'webp' or 'heif' based on the file signature, or None.
+    """
+    if buf[:2] == JPEG_SIGNATURE:
+        return 'jpeg'
+    if buf[:8] == PNG_SIGNATURE:
+        return 'png'
+    if buf[:4] == b'RIFF' and buf[8:12] == b'WEBP':
+        return 'webp'
+    if buf[4:8] == b'ftyp' and bytes(buf[8:12]) in HEIF_BRANDS:
+        return 'heif'
+    return None
+
+
+def find_tiff(buf):
+    """
+    Locates the TIFF structure holding the EXIF data inside `buf` (the start of a file).
+    Returns a memoryview over it (possibly cut off at the end of `buf`), or None if the
+    file has no EXIF block. Raises Truncated if `buf` ends before the block starts,
+    or ExifAt if the block is stored further away.
+    """
+    buf = memoryview(buf)
+    image_format = sniff_format(buf)
+    if image_format == 'jpeg':
+        return _jpeg_tiff(buf)
+    if image_format == 'png':
+        return _png_tiff(buf)
+    if image_format == 'webp':
+        return _webp_tiff(buf)
+    if image_format == 'heif':
+        _heif_exif_location(buf)
+    return None
+
+
+def _jpeg_tiff(buf):
+    pos = 2
+    while True:
+        if pos + 4 > len(buf):
+            raise Truncated()
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Standalone markers carry no length
+            pos += 2
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan / end of image: no EXIF before the pixel data
+            return None
+
+        end = pos + 2 + struct.unpack_from('>H', buf, pos + 2)[0]
+        # APP1 is shared with XMP, so the "Exif\0\0" identifier has to be checked
+        if marker == 0xE1 and buf[pos + 4:pos + 10] == b'Exif\x00\x00':
+            # The segment may extend past the buffer; parse_tiff_gps asks for more if needed
+            return buf[pos + 10:end]
+        pos = end
+
+
+def _png_tiff(buf):
+    pos = len(PNG_SIGNATURE)
+    while True:
+        if pos + 8 > len(buf):
+            raise Truncated()
+        length, chunk_type = struct.unpack_from('>I4s', buf, pos)
+        end = pos + 8 + length
+        if chunk_type == b'eXIf':
+            return buf[pos + 8:end]
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        # Skip data and the 4-byte CRC
+        pos = end + 4
+
+
+def _webp_tiff(buf):
+    pos = 12
+    while True:
+        if pos + 8 > len(buf):
+            raise Truncated()
+        fourcc, size = struct.unpack_from('<4sI', buf, pos)
+        if pos == 12 and fourcc in (b'VP8 ', b'VP8L'):
+            # Simple format: a single image chunk and no metadata
+            return None
+        if fourcc == b'VP8X' and not buf[pos + 8] & 0x08:
+            # Extended format without the "EXIF present" flag
+            return None
+        if fourcc == b'EXIF':
+            payload = buf[pos + 8:pos + 8 + size]
+            return payload[6:] if payload[:6] == b'Exif\x00\x00' else payload
+        # Chunks are padded to an even size
+        pos += 8 + size + (size & 1)
+
+
+def _boxes(buf, start, end):
+    """
+    Yields (type, payload_start, box_end) for every ISO-BMFF box in buf[start:end].
+    """
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise Truncated()
+            size = struct.unpack_from('>Q', buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+    if pos < end:
+        raise Truncated()
+
+
+def _heif_exif_location(buf):
+    """
+    Finds the 'Exif' item of a HEIF/HEIC/AVIF file through the meta/iinf/iloc boxes
+    and raises ExifAt with its position in the file.
+    """
+    for box_type, start, end in _boxes(buf, 0, len(buf)):
+        if box_type == b'meta':
+            if end > len(buf):
+                raise Truncated()
+            # 'meta' is a full box: skip version and flags
+            children = {t: (s, e) for t, s, e in _boxes(buf, start + 4, end)}
+            if b'iinf' not in children or b'iloc' not in children:
+                return None
+            exif_id = _heif_exif_item_id(buf, *children[b'iinf'])
+            if exif_id is None:
+                return None
+            location = _heif_item_location(buf, *children[b'iloc'], exif_id)
+            if location is None:
+                return None
+            raise ExifAt(*location)
+        if box_type == b'mdat':
+            return None
+    raise Truncated()
+
+
+def _heif_exif_item_id(buf, start, end):
+    version = buf[start]
+    pos = start + (6 if version == 0 else 8)
+    for box_type, infe_start, infe_end in _boxes(buf, pos, end):
+        if box_type != b'infe':
+            continue
+        infe_version = buf[infe_start]
+        if infe_version == 2:
+            item_id, _, item_type = struct.unpack_from('>HH4s', buf, infe_start + 4)
+        elif infe_version == 3:
+            item_id, _, item_type = struct.unpack_from('>IH4s', buf, infe_start + 4)
+        else:
+            continue
+        if item_type == b'Exif':
+            return item_id
+    return None
+
+
+def _read_uint(buf, pos, size):
+    if size == 0:
+        return 0, pos
+    return int.from_bytes(buf[pos:pos + size], 'big'), pos + size
+
+
+def _heif_item_location(buf, start, end, wanted_id):
+    version = buf[start]
+    pos = start + 4
+    offset_size, length_size = buf[pos] >> 4, buf[pos] & 0x0F
+    base_offset_size, index_size = buf[pos + 1] >> 4, buf[pos + 1] & 0x0F
+    if version == 0:
+        index_size = 0
+    pos += 2
+    id_size = 2 if version < 2 else 4
+    item_count, pos = _read_uint(buf, pos, id_size)
+
+    for _ in range(item_count):
+        item_id, pos = _read_uint(buf, pos, id_size)
+        construction_method = 0
+        if version in (1, 2):
+            construction_method, pos = _read_uint(buf, pos, 2)
+            construction_method &= 0x0F
+        pos += 2  # data_reference_index
+        base_offset, pos = _read_uint(buf, pos, base_offset_size)
+        extent_count, pos = _read_uint(buf, pos, 2)
+        extents = []
+        for _ in range(extent_count):
+            _, pos = _read_uint(buf, pos, index_size)
+            extent_offset, pos = _read_uint(buf, pos, offset_size)
+            extent_length, pos = _read_uint(buf, pos, length_size)
+            extents.append((base_offset + extent_offset, extent_length))
+        if item_id == wanted_id:
+            # Only plain file offsets with a single extent are supported (what cameras write)
+            if construction_method != 0 or len(extents) != 1:
+                return None
+            return extents[0]
+    return None
+
+
+def webp_exif_tiff(file):
+    """
+    WebP stores EXIF in a chunk after the image data, so instead of reading the
+    file we hop from chunk header to chunk header with seeks.
+    Returns a memoryview over the TIFF block, or None.
+    """
+    file.seek(12)
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        fourcc, size = struct.unpack('<4sI', header)
+        if fourcc == b'EXIF':
+            payload = memoryview(file.read(size))
+            # Some writers keep the JPEG-style identifier in front of the TIFF header
+            return payload[6:] if payload[:6] == b'Exif\x00\x00' else payload
+        # Chunks are padded to an even size
+        file.seek(size + (size & 1), 1)
+
+
+def heif_exif_tiff(payload):
+    """
+    Returns the TIFF part of a HEIF 'Exif' item: a 4-byte header offset precedes it.
+    """
+    payload = memoryview(payload)
+    if len(payload) < 4:
+        return None
+    skip = struct.unpack_from('>I', payload, 0)[0]
+    return payload[4 + skip:]
+
+
+def _ifd_entries(tiff, order, offset):
+    count = struct.unpack_from(order + 'H', tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, field_type, value_count = struct.unpack_from(order + 'HHI', tiff, entry)
+        yield tag, field_type, value_count, entry + 8
+
+
+def parse_tiff_gps(tiff):
+    """
+    Reads the GPS IFD of a TIFF/EXIF block.
+    Returns a dict like {'GPSLatitude': (deg, min, sec), 'GPSLatitudeRef': 'N', ...}
+    containing only the tags present, or None if there is no GPS IFD.
+    Raises Truncated if the block is cut off before the GPS values.
+    """
+    try:
+        return _parse_tiff_gps(memoryview(tiff))
+    except struct.error:
+        # unpack_from never reads past the buffer, it raises instead
+        raise Truncated()
+
+
+def _parse_tiff_gps(tiff):
+    if tiff[:2] == b'II':
+        order = '<'
+    elif tiff[:2] == b'MM':
+        order = '>'
+    else:
+        return None
+    if struct.unpack_from(order + 'H', tiff, 2)[0] != 42:
+        return None
+
+    ifd0 = struct.unpack_from(order + 'I', tiff, 4)[0]
+    gps_ifd = next(
+        (struct.unpack_from(order + 'I', tiff, pos)[0]
+         for tag, _, _, pos in _ifd_entries(tiff, order, ifd0) if tag == GPS_IFD_POINTER),
+        None
+    )
+    if gps_ifd is None:
+        return None
+
+    gps_info = {}
+    for tag, field_type, count, pos in _ifd_entries(tiff, order, gps_ifd):
+        name = GPS_TAGS.get(tag)
+        if name is None:
+            continue
+        # Values longer than 4 bytes are stored elsewhere; the field holds their offset
+        if TYPE_SIZES.get(field_type, 1) * count > 4:
+            pos = struct.unpack_from(order + 'I', tiff, pos)[0]
+
+        if field_type == ASCII:
+            if pos + count > len(tiff):
+                raise Truncated()
+            gps_info[name] = bytes(tiff[pos:pos + count]).split(b'\x00', 1)[0].decode('ascii', 'replace')
+        elif field_type in (RATIONAL, SRATIONAL):
+            code = 'I' if field_type == RATIONAL else 'i'
+            values = struct.unpack_from(f'{order}{2 * count}{code}', tiff, pos)
+            # A zero denominator means the value is unknown
+            if all(values[1::2]):
+                gps_info[name] = tuple(n / d for n, d in zip(values[::2], values[1::2]))
+    return gps_info
+
+
+def read_gps_info(file, head_size=HEAD_SIZE):
+    """
+    Reads only the metadata header of `file` and returns its GPS tags (see parse_tiff_gps),
+    or None if there are none. The file position is left unspecified.
+    """
+    while True:
+        file.seek(0)
+        head = file.read(head_size)
+        try:
+            try:
+                if sniff_format(head) == 'webp':
+                    tiff = webp_exif_tiff(file)
+                else:
+                    tiff = find_tiff(head)
+            except ExifAt as location:
+                file.seek(location.offset)
+                tiff = heif_exif_tiff(file.read(location.length))
+            return parse_tiff_gps(tiff) if tiff is not None else None
+        except Truncated:
+            # Rare: metadata larger than the head. Retry with a bigger one, within limits.
+            if len(head) < head_size or head_size >= MAX_HEAD_SIZE:
+                return None
+            head_size *= 4
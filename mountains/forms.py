@@ -1,8 +1,9 @@
 # mountains/forms.py
 from django import forms
 from django.core.exceptions import ValidationError
-from .models import Photo, Mountain
-from .utils import get_exif_data, check_proximity
+from .metrics import stage
+from .models import Photo, Track
+from .tracks import MAX_TRACK_SIZE, TRACK_TOO_LARGE_MESSAGE, UNSUPPORTED_TRACK_MESSAGE, track_format
 
 class PhotoUploadForm(forms.ModelForm):
     class Meta:
@@ -10,55 +11,55 @@ class PhotoUploadForm(forms.ModelForm):
         # User only provides the file; location data is extracted automatically
         fields = ['image']
 
+    def __init__(self, *args, upload_rejection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Message set by GpsPrecheckUploadHandler when it dropped the file while streaming.
+        # The file is then missing, so "required" must not hide the real reason.
+        self.upload_rejection = upload_rejection
+        if upload_rejection:
+            self.fields['image'].required = False
+
     def clean_image(self):
         """
         Validates the uploaded image file.
-        Logic: 
-        1. Extract GPS data from EXIF.
-        2. Check if coordinates match a known mountain.
-        3. Store these derived values to be used in the save() method.
+        Only photos the streaming pre-check already rejected fail here. The full
+        EXIF extraction and mountain matching run in the background after upload
+        (see verification.verify_photo_job), so the request does not wait for them.
         """
-        image = self.cleaned_data.get('image')
-        
-        # 1. Attempt to extract EXIF data (Latitude/Longitude)
-        lat, lon = get_exif_data(image)
-        
-        if not lat or not lon:
-            raise ValidationError("This photo lacks GPS (EXIF) data. Please ensure location services were enabled on your camera.")
-
-        # 2. Check proximity against all mountains in the database
-        all_mountains = Mountain.objects.all()
-        found_mountain = check_proximity(lat, lon, all_mountains)
+        with stage('form.clean_image'):
+            if self.upload_rejection:
+                raise ValidationError(self.upload_rejection)
+            return self.cleaned_data.get('image')
 
-        if not found_mountain:
-            raise ValidationError(f"No match found! Your location ({lat:.4f}, {lon:.4f}) does not match any mountain peak in our database.")
+    def save(self, commit=True):
+        """
+        Overridden save method.
+        New photos start as PENDING until the verification job has processed them.
+        """
+        with stage('form.save'):
+            instance = super().save(commit=False)
+            instance.status = Photo.Status.PENDING
 
-        # 3. Store the found data temporarily on the form instance.
-        # We cannot assign them to the database object yet because save() hasn't been called.
-        # We attach 'cleaned_geo_data' to 'self' to pass it to the save() method below.
-        self.cleaned_geo_data = {
-            'latitude': lat,
-            'longitude': lon,
-            'matched_mountain': found_mountain
-        }
+            if commit:
+                instance.save()
+        return instance
 
-        return image
+class TrackUploadForm(forms.ModelForm):
+    class Meta:
+        model = Track
+        fields = ['file']
+        widgets = {'file': forms.ClearableFileInput(attrs={'accept': '.gpx,.fit'})}
 
-    def save(self, commit=True):
+    def clean_file(self):
         """
-        Overridden save method.
-        Injects the calculated GPS data and matched mountain (from clean_image)
-        into the model instance before writing to the database.
+        Only checks that the file looks like a GPX or FIT track. Reading the points
+        and matching them run in the background (see tracks.process_track_job).
         """
-        instance = super().save(commit=False)
-        
-        # Retrieve the data we calculated during validation
-        geo_data = getattr(self, 'cleaned_geo_data', None)
-        if geo_data:
-            instance.latitude = geo_data['latitude']
-            instance.longitude = geo_data['longitude']
-            instance.matched_mountain = geo_data['matched_mountain']
-        
-        if commit:
-            instance.save()
-        return instance
\ No newline at end of file
+        file = self.cleaned_data.get('file')
+        if file is None:
+            return file
+        if file.size > MAX_TRACK_SIZE:
+            raise ValidationError(TRACK_TOO_LARGE_MESSAGE.format(max_mb=MAX_TRACK_SIZE // 2**20))
+        if track_format(file) is None:
+            raise ValidationError(UNSUPPORTED_TRACK_MESSAGE)
+        return file
@@ -0,0 +1,422 @@
+# mountains/importers.py
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+
+from .archive import init_archive_worker, iter_archive, stage_entries
+from .catalog import bump_catalog_version, get_catalog
+from .dedup import COUNTED_STATUSES
+from .models import Badge, Job, Mountain, Photo
+from .progress import rebuild_badge_progress, rebuild_progress
+from .storage import sharded_name
+from .utils import check_proximity_many
+from .verification import NO_GPS_MESSAGE, no_match_message
+
+# Outcomes of an archive entry in the photo import report
+IMPORTED, DUPLICATE, REJECTED = 'imported', 'duplicate', 'rejected'
+
+# Fields an import may set. Radius is only overwritten when the source provides it,
+# so hand-tuned radii survive a refresh of names/coordinates.
+MOUNTAIN_FIELDS = ['name', 'latitude', 'longitude', 'altitude']
+
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+JSON_WHITESPACE = re.compile(r'[\s,]*')
+
+
+class ImportRowError(ValueError):
+    """
+    A source row that can't be turned into a mountain (missing or invalid field).
+    """
+
+
+def iter_feature_collection(file, chunk_size=1 << 16):
+    """
+    Yields the features of a GeoJSON FeatureCollection one by one, reading the
+    file in chunks, so memory stays flat however many features it holds.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            raise ValueError("No \"features\" array found in the GeoJSON file.")
+        buf += chunk
+        match = FEATURES_START.search(buf)
+        if match:
+            pos = match.end()
+            break
+
+    while True:
+        pos = JSON_WHITESPACE.match(buf, pos).end()
+        if buf.startswith(']', pos):
+            return
+        try:
+            feature, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Most likely a feature cut by the chunk boundary: read on and retry
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield feature
+        pos = end
+
+
+def iter_geojson_lines(file):
+    """
+    Yields the features of newline-delimited GeoJSON (one Feature per line).
+    """
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def number(value, field, cast=float):
+    try:
+        # OSM "ele" tags are sometimes written like "2499 m"
+        return cast(float(str(value).split()[0].replace(',', '.')))
+    except (TypeError, ValueError, IndexError):
+        raise ImportRowError(f"invalid {field}: {value!r}")
+
+
+def row_from_feature(feature):
+    """
+    Maps a GeoJSON Point feature to a dict of Mountain fields.
+    The external id is the feature id, or an "id"/"external_id" property.
+    """
+    props = feature.get('properties') or {}
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') != 'Point':
+        raise ImportRowError("geometry is not a Point")
+    coordinates = geometry['coordinates']
+
+    row = {
+        'external_id': feature.get('id') or props.get('external_id') or props.get('id'),
+        'name': props.get('name'),
+        'longitude': coordinates[0],
+        'latitude': coordinates[1],
+        'altitude': props.get('altitude', props.get('ele', coordinates[2] if len(coordinates) > 2 else None)),
+    }
+    if props.get('radius') is not None:
+        row['radius'] = props['radius']
+    return clean_row(row)
+
+
+def row_from_csv(record):
+    """
+    Maps a CSV record to a dict of Mountain fields. Accepted headers:
+    external_id (or id), name, latitude (or lat), longitude (or lon), altitude (or ele), radius.
+    """
+    row = {
+        'external_id': record.get('external_id') or record.get('id'),
+        'name': record.get('name'),
+        'latitude': record.get('latitude', record.get('lat')),
+        'longitude': record.get('longitude', record.get('lon')),
+        'altitude': record.get('altitude', record.get('ele')),
+    }
+    if record.get('radius') not in (None, ''):
+        row['radius'] = record['radius']
+    return clean_row(row)
+
+
+def clean_row(row):
+    if not row['external_id']:
+        raise ImportRowError("missing external id")
+    if not row['name']:
+        raise ImportRowError("missing name")
+    row['external_id'] = str(row['external_id'])[:100]
+    row['name'] = str(row['name'])[:100]
+    row['latitude'] = number(row['latitude'], 'latitude')
+    row['longitude'] = number(row['longitude'], 'longitude')
+    row['altitude'] = number(row['altitude'], 'altitude', int)
+    if 'radius' in row:
+        row['radius'] = number(row['radius'], 'radius', int)
+    if not (-90 <= row['latitude'] <= 90 and -180 <= row['longitude'] <= 180):
+        raise ImportRowError("coordinates out of range")
+    return row
+
+
+def read_mountain_rows(path):
+    """
+    Yields (row or None, error or None) for every record of a .geojson/.json
+    FeatureCollection, a .geojsonl/.geojsons/.ndjson feature-per-line file or a .csv file.
+    """
+    suffix = Path(path).suffix.lower()
+    with open(path, encoding='utf-8', newline='') as file:
+        if suffix == '.csv':
+            records, convert = csv.DictReader(file), row_from_csv
+        elif suffix in ('.geojsonl', '.geojsons', '.ndjson'):
+            records, convert = iter_geojson_lines(file), row_from_feature
+        else:
+            records, convert = iter_feature_collection(file), row_from_feature
+        for record in records:
+            try:
+                yield convert(record), None
+            except (ImportRowError, KeyError, IndexError, TypeError, AttributeError) as e:
+                yield None, str(e) or type(e).__name__
+
+
+def upsert_mountains(rows, batch_size=1000):
+    """
+    Inserts or updates mountains by external_id with one INSERT ... ON CONFLICT
+    statement per batch. Returns the number of rows written.
+    """
+    written = 0
+    while batch := list(islice(rows, batch_size)):
+        # Rows with and without a radius need different update_fields
+        for with_radius in (False, True):
+            part = [row for row in batch if ('radius' in row) == with_radius]
+            if not part:
+                continue
+            # A file may list the same peak twice; the last occurrence wins
+            part = list({row['external_id']: row for row in part}.values())
+            Mountain.objects.bulk_create(
+                [Mountain(**row) for row in part],
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=MOUNTAIN_FIELDS + (['radius'] if with_radius else []),
+            )
+            written += len(part)
+    return written
+
+
+def import_memberships(path, batch_size=1000):
+    """
+    Creates or refreshes badges from a CSV with the columns
+    badge (badge external id), name, description (optional) and mountain (mountain external id).
+    Each badge listed in the file gets exactly the listed mountains.
+    Returns (badge ids, number of links, unknown mountain ids).
+    """
+    badges = {}
+    members = {}
+    with open(path, encoding='utf-8', newline='') as file:
+        for record in csv.DictReader(file):
+            key = record['badge']
+            badges.setdefault(key, {'name': record.get('name') or key, 'description': record.get('description') or ''})
+            members.setdefault(key, set()).add(record['mountain'])
+
+    Badge.objects.bulk_create(
+        [Badge(external_id=key, **fields) for key, fields in badges.items()],
+        update_conflicts=True, unique_fields=['external_id'], update_fields=['name', 'description'],
+        batch_size=batch_size,
+    )
+    badge_ids = dict(Badge.objects.filter(external_id__in=list(badges)).values_list('external_id', 'id'))
+
+    wanted = set().union(*members.values()) if members else set()
+    mountain_ids = {}
+    wanted_list = list(wanted)
+    for start in range(0, len(wanted_list), batch_size):
+        mountain_ids.update(Mountain.objects.filter(external_id__in=wanted_list[start:start + batch_size])
+                            .values_list('external_id', 'id'))
+
+    Through = Badge.mountains.through
+    Through.objects.filter(badge_id__in=badge_ids.values()).delete()
+    links = [
+        Through(badge_id=badge_ids[key], mountain_id=mountain_ids[external_id])
+        for key, external_ids in members.items()
+        for external_id in external_ids
+        if external_id in mountain_ids
+    ]
+    Through.objects.bulk_create(links, batch_size=batch_size)
+    return list(badge_ids.values()), len(links), sorted(wanted - mountain_ids.keys())
+
+
+@transaction.atomic
+def import_catalog(path, memberships=None, batch_size=1000, on_error=None):
+    """
+    Imports a mountain dataset (and optionally badge memberships) in one transaction.
+    Bulk writes bypass the model signals, so the catalog snapshot and the badge
+    progress tables are refreshed once at the end instead of once per row.
+    Returns a dict of counters.
+    """
+    stats = {'read': 0, 'written': 0, 'skipped': 0, 'badges': 0, 'links': 0, 'unknown_mountains': []}
+
+    def valid_rows():
+        for row, error in read_mountain_rows(path):
+            stats['read'] += 1
+            if error:
+                stats['skipped'] += 1
+                if on_error:
+                    on_error(stats['read'], error)
+                continue
+            yield row
+
+    stats['written'] = upsert_mountains(valid_rows(), batch_size)
+
+    badge_ids = []
+    if memberships:
+        badge_ids, stats['links'], stats['unknown_mountains'] = import_memberships(memberships, batch_size)
+        stats['badges'] = len(badge_ids)
+        rebuild_badge_progress(badge_ids)
+
+    transaction.on_commit(bump_catalog_version)
+    return stats
+
+
+def staging_directory():
+    """
+    Where archive workers stage the files they read. Inside the storage location
+    when it's on the local filesystem, so accepted files are moved into place
+    with a rename instead of being copied again. Files left behind by an
+    interrupted import are named .tmp-* and can be deleted.
+    """
+    if isinstance(default_storage, FileSystemStorage):
+        return os.path.join(default_storage.location, 'peaks', '.import'), False
+    return tempfile.mkdtemp(prefix='photo-import-'), True
+
+
+def store_staged(staged, name):
+    """
+    Puts a staged file into storage under `name` and returns the stored name.
+    """
+    if isinstance(default_storage, FileSystemStorage):
+        target = default_storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(staged, default_storage.file_permissions_mode)
+        # Content-addressed: a file already there has the same bytes
+        os.replace(staged, target)
+        return name
+    with open(staged, 'rb') as f:
+        name = default_storage.save(name, File(f))
+    os.remove(staged)
+    return name
+
+
+def discard_staged(result):
+    if result.get('staged') and os.path.exists(result['staged']):
+        os.remove(result['staged'])
+
+
+def import_photo_batch(user, results, catalog, report):
+    """
+    Matches one batch of staged archive entries in a single pass, stores the
+    accepted files and creates their Photo rows (and rendition jobs) with one
+    bulk INSERT each. Rejected and duplicate entries are only reported.
+    """
+    def reject(result, reason):
+        discard_staged(result)
+        report(result['name'], REJECTED, reason)
+
+    located = []
+    for result in results:
+        if 'error' in result:
+            reject(result, result['error'])
+        elif not result['latitude'] or not result['longitude']:
+            reject(result, NO_GPS_MESSAGE)
+        else:
+            located.append(result)
+
+    matches = check_proximity_many([(r['latitude'], r['longitude']) for r in located], catalog.index)
+    matched = []
+    for result, mountain in zip(located, matches):
+        if mountain is None:
+            reject(result, no_match_message(result['latitude'], result['longitude'], catalog))
+        else:
+            matched.append((result, mountain))
+
+    # Earlier batches are committed already, so the database also catches repeats
+    # further apart in the archive; only this batch needs the in-memory check.
+    # The user's rejected copies are not duplicates (see dedup.COUNTED_STATUSES),
+    # they only lend their blob.
+    known = {}
+    for row in (Photo.objects.filter(content_hash__in={r['content_hash'] for r, _ in matched})
+                .order_by('id').values('user_id', 'status', 'content_hash', 'image', 'thumbnail', 'preview')):
+        row['own'] = row['user_id'] == user.id and row['status'] in COUNTED_STATUSES
+        if row['own'] or row['content_hash'] not in known:
+            known[row['content_hash']] = row
+
+    photos = []
+    for result, mountain in matched:
+        content_hash = result['content_hash']
+        existing = known.get(content_hash)
+        if existing is not None and existing['own']:
+            discard_staged(result)
+            report(result['name'], DUPLICATE, existing['image'])
+            continue
+
+        photo = Photo(
+            user=user, latitude=result['latitude'], longitude=result['longitude'],
+            matched_mountain_id=mountain.id, status=Photo.Status.VERIFIED, content_hash=content_hash,
+        )
+        if existing is not None:
+            # Another user's copy of the same file: share its blob and renditions
+            discard_staged(result)
+            photo.image, photo.thumbnail, photo.preview = existing['image'], existing['thumbnail'], existing['preview']
+        else:
+            photo.image = store_staged(result['staged'], sharded_name(content_hash, result['name']))
+        known[content_hash] = {'own': True, 'image': photo.image.name}
+        photos.append(photo)
+        report(result['name'], IMPORTED, mountain.name)
+
+    with transaction.atomic():
+        Photo.objects.bulk_create(photos)
+        Job.objects.bulk_create([
+            Job(task='mountains.renditions.generate_renditions_job', payload={'photo_id': photo.id})
+            for photo in photos if not (photo.thumbnail and photo.preview)
+        ])
+    return len(photos)
+
+
+def import_photo_archive(path, user, workers=2, batch_size=200, report=None):
+    """
+    Imports a user's photo archive (a directory or a ZIP file) without going
+    through the upload view. Entries are streamed to a process pool in batches
+    that read, hash and stage the files and extract their GPS position; the
+    results are matched and inserted batch by batch in this process. Only a
+    bounded window of batches is in flight, so memory stays flat however large
+    the archive is. Only photos that match a mountain are imported (as verified).
+    `report(name, outcome, detail)` is called for every entry.
+    Returns a dict of counters.
+    """
+    stats = {'files': 0, 'bytes': 0, IMPORTED: 0, DUPLICATE: 0, REJECTED: 0}
+
+    def record(name, outcome, detail):
+        stats[outcome] += 1
+        if report:
+            report(name, outcome, detail)
+
+    catalog = get_catalog()
+    staging, temporary = staging_directory()
+
+    def finish(results):
+        stats['files'] += len(results)
+        stats['bytes'] += sum(r.get('size', 0) for r in results)
+        import_photo_batch(user, results, catalog, record)
+
+    entries = iter_archive(path)
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=init_archive_worker, initargs=(path, staging)) as pool:
+                pending = deque()
+                while batch := list(islice(entries, batch_size)):
+                    pending.append(pool.submit(stage_entries, batch))
+                    if len(pending) >= workers * 2:
+                        finish(pending.popleft().result())
+                while pending:
+                    finish(pending.popleft().result())
+        else:
+            init_archive_worker(path, staging)
+            while batch := list(islice(entries, batch_size)):
+                finish(stage_entries(batch))
+    finally:
+        if temporary:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # bulk_create() bypasses the signals, so the user's visit and badge tables are
+    # rebuilt once (which also bumps their progress version)
+    if stats[IMPORTED]:
+        rebuild_progress([user.id])
+    return stats
@@ -0,0 +1,88 @@
+# mountains/jobs.py
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+# A job whose worker died is picked up again after this long
+LOCK_TIMEOUT = timedelta(minutes=10)
+# How many candidate rows a worker looks at per claim attempt
+CLAIM_BATCH = 10
+
+
+def enqueue(task, **payload):
+    """
+    Adds a job for the function at dotted path `task`, called later as task(**payload).
+    Runs in the caller's transaction, so the job exists only if the surrounding
+    changes (e.g. the Photo insert) are committed too.
+    """
+    return Job.objects.create(task=task, payload=payload)
+
+
+def _claimable(now):
+    return (
+        Q(status=Job.Status.QUEUED, run_after__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+    )
+
+
+def claim_job():
+    """
+    Atomically takes the next due job, or returns None if there is nothing to do.
+    The conditional UPDATE only succeeds for one worker, so no row locks
+    (unsupported on SQLite) are needed.
+    """
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(_claimable(now)).order_by('run_after', 'id').values_list('id', flat=True)[:CLAIM_BATCH]
+    )
+    for job_id in candidates:
+        claimed = Job.objects.filter(_claimable(now), id=job_id).update(
+            status=Job.Status.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Executes a claimed job. Finished jobs are deleted; failures are retried with
+    exponential backoff until JOB_MAX_ATTEMPTS, then kept as FAILED for inspection.
+    """
+    try:
+        import_string(job.task)(**job.payload)
+    except Exception:
+        max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+        if job.attempts >= max_attempts:
+            job.status = Job.Status.FAILED
+        else:
+            job.status = Job.Status.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+        job.save(update_fields=['status', 'run_after', 'locked_at', 'last_error'])
+        return False
+
+    job.delete()
+    return True
+
+
+def run_pending(limit=None):
+    """
+    Runs due jobs in the current thread until the queue is empty (or `limit` jobs ran).
+    Returns the number of jobs processed.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
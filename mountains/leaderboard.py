@@ -0,0 +1,152 @@
+# mountains/leaderboard.py
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import UserBadgeProgress, UserMountainVisit, UserScore
+
+# Rankings are the same for everybody, so the top of each list is shared by all
+# requests for a short while instead of being queried per page view
+TOP_CACHE_KEY = 'mountains:leaderboard:{board}'
+TOP_CACHE_TIMEOUT = 60
+TOP_SIZE = 50
+
+# Sort column of every global ranking
+BOARDS = {'peaks': 'peak_count', 'badges': 'badge_count'}
+
+
+def adjust_score(user_id, peaks=0, badges=0):
+    """
+    Applies a change of the user's counters. Called by mountains/progress.py in
+    the same transaction as the visit/badge rows it mirrors.
+    """
+    if not (peaks or badges):
+        return
+    updated = UserScore.objects.filter(user_id=user_id).update(
+        peak_count=Greatest(F('peak_count') + peaks, 0),
+        badge_count=Greatest(F('badge_count') + badges, 0),
+    )
+    if not updated:
+        UserScore.objects.get_or_create(
+            user_id=user_id, defaults={'peak_count': max(peaks, 0), 'badge_count': max(badges, 0)}
+        )
+
+
+def compute_scores(user_ids=None):
+    """
+    Fresh counters from the materialized progress tables (optionally for some users).
+    Returns a list of unsaved UserScore instances, one per user with any visit.
+    """
+    visits = UserMountainVisit.objects.all()
+    badges = UserBadgeProgress.objects.filter(unlocked_at__isnull=False)
+    if user_ids is not None:
+        visits = visits.filter(user_id__in=user_ids)
+        badges = badges.filter(user_id__in=user_ids)
+
+    scores = {user_id: UserScore(user_id=user_id, peak_count=count)
+              for user_id, count in visits.values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')}
+    for user_id, count in badges.values('user_id').annotate(count=Count('id')).values_list('user_id', 'count'):
+        scores.setdefault(user_id, UserScore(user_id=user_id)).badge_count = count
+    return list(scores.values())
+
+
+@transaction.atomic
+def rebuild_scores(user_ids=None, batch_size=1000):
+    """
+    Replaces the UserScore rows (optionally of some users, in chunks of
+    batch_size ids) with freshly computed ones.
+    """
+    if user_ids is not None:
+        user_ids = sorted(set(user_ids))
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            UserScore.objects.filter(user_id__in=chunk).delete()
+            UserScore.objects.bulk_create(compute_scores(chunk), batch_size=batch_size)
+        return
+    UserScore.objects.all().delete()
+    UserScore.objects.bulk_create(compute_scores(), batch_size=batch_size)
+
+
+def ranked(rows, key):
+    """
+    Adds competition ranks ("1, 2, 2, 4") to rows sorted by `key` descending,
+    starting from the top of the list.
+    """
+    previous, rank = None, 0
+    for position, row in enumerate(rows, 1):
+        if row[key] != previous:
+            previous, rank = row[key], position
+        row['rank'] = rank
+    return rows
+
+
+def top_users(board='peaks', limit=TOP_SIZE):
+    """
+    The best users of a global ranking: [{'rank', 'username', 'peak_count', 'badge_count'}, ...].
+    One read of the first `limit` index entries, cached for TOP_CACHE_TIMEOUT seconds.
+    """
+    key = TOP_CACHE_KEY.format(board=f'{board}:{limit}')
+    rows = cache.get(key)
+    if rows is None:
+        column = BOARDS[board]
+        rows = ranked(list(
+            UserScore.objects.filter(**{f'{column}__gt': 0}).order_by(f'-{column}', 'user_id')
+            .values('user_id', 'user__username', 'peak_count', 'badge_count')[:limit]
+        ), column)
+        cache.set(key, rows, TOP_CACHE_TIMEOUT)
+    return rows
+
+
+def user_rank(user_id, board='peaks'):
+    """
+    (rank, score) of the user in a global ranking; rank is None while the score is 0.
+    The rank is one more than the number of users with a higher score: a range
+    count over the ranking index, not an aggregation of photos.
+    """
+    column = BOARDS[board]
+    score = UserScore.objects.filter(user_id=user_id).values_list(column, flat=True).first() or 0
+    if not score:
+        return None, 0
+    return UserScore.objects.filter(**{f'{column}__gt': score}).count() + 1, score
+
+
+def top_badge_users(badge_id, limit=TOP_SIZE):
+    """
+    The users closest to completing a badge (or done): [{'rank', 'username', 'visited_count', 'unlocked_at'}, ...].
+    """
+    key = TOP_CACHE_KEY.format(board=f'badge:{badge_id}:{limit}')
+    rows = cache.get(key)
+    if rows is None:
+        rows = ranked(list(
+            UserBadgeProgress.objects.filter(badge_id=badge_id, visited_count__gt=0)
+            .order_by('-visited_count', 'user_id')
+            .values('user_id', 'user__username', 'visited_count', 'unlocked_at')[:limit]
+        ), 'visited_count')
+        cache.set(key, rows, TOP_CACHE_TIMEOUT)
+    return rows
+
+
+def badge_rank(user_id, badge_id):
+    """
+    (rank, visited count) of the user in a badge's ranking; rank is None while the count is 0.
+    """
+    count = UserBadgeProgress.objects.filter(user_id=user_id, badge_id=badge_id).values_list(
+        'visited_count', flat=True
+    ).first() or 0
+    if not count:
+        return None, 0
+    return UserBadgeProgress.objects.filter(badge_id=badge_id, visited_count__gt=count).count() + 1, count
+
+
+def scores_drift(user_ids=None):
+    """
+    Number of users whose stored counters differ from a fresh computation.
+    """
+    rows = UserScore.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    stored = {row for row in rows.filter(Q(peak_count__gt=0) | Q(badge_count__gt=0))
+              .values_list('user_id', 'peak_count', 'badge_count')}
+    fresh = {(s.user_id, s.peak_count, s.badge_count) for s in compute_scores(user_ids)}
+    return len({row[0] for row in stored ^ fresh})
@@ -0,0 +1,77 @@
+# mountains/management/commands/benchmark_exif.py
+import io
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+from PIL.ExifTags import TAGS, GPSTAGS
+
+from mountains.benchmarking import phone_sized_jpeg
+from mountains.utils import get_exif_data, get_decimal_from_dms
+
+
+def pillow_exif_data(image_file):
+    """
+    The previous Pillow-based extraction, kept here as the benchmark baseline.
+    """
+    try:
+        image_file.seek(0)
+        exif_data = Image.open(image_file)._getexif()
+        if not exif_data:
+            return None, None
+        gps_raw = next((v for k, v in exif_data.items() if TAGS.get(k) == "GPSInfo"), None)
+        if not gps_raw:
+            return None, None
+        gps_info = {GPSTAGS.get(k, k): v for k, v in gps_raw.items()}
+        lat = get_decimal_from_dms(gps_info['GPSLatitude'], gps_info['GPSLatitudeRef'])
+        lon = get_decimal_from_dms(gps_info['GPSLongitude'], gps_info['GPSLongitudeRef'])
+        return lat, lon
+    except Exception:
+        return None, None
+
+
+def measure(func, data, repeat):
+    """
+    Returns (microseconds per call, peak traced bytes, result) for func on an in-memory file.
+    """
+    files = [io.BytesIO(data) for _ in range(repeat)]
+    start = time.perf_counter()
+    for f in files:
+        result = func(f)
+    elapsed = (time.perf_counter() - start) / repeat * 1e6
+
+    tracemalloc.start()
+    func(io.BytesIO(data))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark of the header-only EXIF GPS reader against the Pillow path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('files', nargs='*', help="Extra image files to benchmark.")
+
+    def handle(self, *args, **options):
+        samples = [('synthetic 12 MP', phone_sized_jpeg(4000, 3000))]
+        for path in options['files']:
+            with open(path, 'rb') as f:
+                samples.append((os.path.basename(path), f.read()))
+
+        self.stdout.write(f"{'file':<24} {'size MB':>8} {'reader':>8} {'us/call':>10} {'peak KB':>9}  result")
+        for name, data in samples:
+            expected = None
+            for label, func in (('pillow', pillow_exif_data), ('header', get_exif_data)):
+                us, peak, result = measure(func, data, options['repeat'])
+                self.stdout.write(
+                    f"{name:<24} {len(data) / 1e6:>8.1f} {label:>8} {us:>10.1f} {peak / 1024:>9.1f}  {result}"
+                )
+                if expected is None:
+                    expected = result
+                elif [round(v, 9) if v is not None else None for v in result] != \
+                        [round(v, 9) if v is not None else None for v in expected]:
+                    self.stderr.write(self.style.ERROR(f"{name}: readers disagree"))
@@ -0,0 +1,80 @@
+# mountains/management/commands/benchmark_matching.py
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from mountains.benchmarking import synthetic_catalog
+from mountains.spatial import MountainIndex, mountain_arrays
+from mountains.utils import check_proximity, check_proximity_batch, nearest_match
+
+
+def linear_scan(photo_lat, photo_lon, mountains):
+    """
+    The pre-index algorithm: one geodesic() call per mountain in the catalog.
+    """
+    return nearest_match((photo_lat, photo_lon), mountains)
+
+
+def time_per_query(func, points):
+    start = time.perf_counter()
+    for lat, lon in points:
+        func(lat, lon)
+    return (time.perf_counter() - start) / len(points) * 1e6
+
+
+class Command(BaseCommand):
+    help = "Benchmarks summit matching latency for growing catalog sizes (index, NumPy batch, linear scan)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--linear-limit', type=int, default=1000,
+                            help="Skip the linear scan for catalogs larger than this (it gets very slow).")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        self.stdout.write(f"{'mountains':>10} {'build ms':>10} {'index us/q':>12} {'batch us/q':>12} {'linear us/q':>12} {'hits':>6}")
+        for size in options['sizes']:
+            catalog = synthetic_catalog(size, rng)
+
+            # Half the queries sit right on a peak (hit), half are random points (mostly misses).
+            points = []
+            for _ in range(options['queries']):
+                if rng.random() < 0.5:
+                    m = rng.choice(catalog)
+                    points.append((m.latitude + rng.uniform(-0.0005, 0.0005), m.longitude))
+                else:
+                    points.append((rng.uniform(45.0, 55.0), rng.uniform(10.0, 30.0)))
+
+            start = time.perf_counter()
+            index = MountainIndex(catalog)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            index_us = time_per_query(lambda lat, lon: check_proximity(lat, lon, index), points)
+            scalar_results = [check_proximity(lat, lon, index) for lat, lon in points]
+            hits = sum(1 for m in scalar_results if m is not None)
+
+            arrays = mountain_arrays(catalog)
+            start = time.perf_counter()
+            batch_results = check_proximity_batch(points, catalog, arrays)
+            batch_us = (time.perf_counter() - start) / len(points) * 1e6
+            # The batch matcher must return exactly what the scalar path returns.
+            if batch_results != scalar_results:
+                self.stderr.write(self.style.ERROR("Batch results differ from check_proximity!"))
+
+            if size <= options['linear_limit']:
+                linear_us = f"{time_per_query(lambda lat, lon: linear_scan(lat, lon, catalog), points):12.1f}"
+                # Both strategies must agree on every point.
+                mismatches = sum(
+                    1 for (lat, lon), m in zip(points, scalar_results)
+                    if m is not linear_scan(lat, lon, catalog)
+                )
+                if mismatches:
+                    self.stderr.write(self.style.ERROR(f"{mismatches} results differ from the linear scan!"))
+            else:
+                linear_us = f"{'skipped':>12}"
+
+            self.stdout.write(f"{size:>10} {build_ms:>10.1f} {index_us:>12.1f} {batch_us:>12.1f} {linear_us} {hits:>6}")
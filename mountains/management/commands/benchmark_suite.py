@@ -0,0 +1,219 @@
+# mountains/management/commands/benchmark_suite.py
+import io
+import random
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from mountains.benchmarking import (
+    LAT_RANGE, LON_RANGE, compare, load_baseline, measure, phone_sized_jpeg, save_baseline,
+)
+from mountains.catalog import get_catalog
+from mountains.models import Badge, Mountain, Photo
+from mountains.progress import bump_progress_version, rebuild_progress
+from mountains.utils import check_proximity, get_exif_data, nearest_mountains
+from mountains.views import calculate_badge_stats
+
+# Admin pages whose query count must not grow with the number of rows shown
+ADMIN_PAGES = {
+    'admin_photo_list': '/admin/mountains/photo/',
+    'admin_photo_filtered': '/admin/mountains/photo/?status__exact=verified',
+    'admin_mountain_list': '/admin/mountains/mountain/',
+    'admin_badge_change': '/admin/mountains/badge/{badge_id}/change/',
+}
+
+# Everything runs against a throwaway database, media directory and cache
+BENCHMARK_SETTINGS = {
+    'ALLOWED_HOSTS': ['testserver'],
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    # Seeding users shouldn't be dominated by password hashing
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the upload and profile hot paths on a synthetic dataset in a throwaway database "
+        "and compares the results with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mountains', type=int, default=10000)
+        parser.add_argument('--badges', type=int, default=200)
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--photos', type=int, default=2000, help="Verified photos per user.")
+        parser.add_argument('--images', type=int, default=10, help="EXIF-tagged JPEGs to generate and upload.")
+        parser.add_argument('--image-size', default='4000x3000', help="WIDTHxHEIGHT of the generated JPEGs.")
+        parser.add_argument('--queries', type=int, default=2000, help="check_proximity() lookups.")
+        parser.add_argument('--repeat', type=int, default=20, help="Calls per view benchmark.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', default='benchmarks/baseline.json')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Store these results as the new baseline instead of comparing.")
+        parser.add_argument('--tolerance', type=float, default=1.5,
+                            help="Allowed slowdown factor of p50/p95 against the baseline.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root, **BENCHMARK_SETTINGS):
+                results = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"{'benchmark':<22} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'queries':>8}")
+        for name, r in results.items():
+            self.stdout.write(f"{name:<22} {r['calls']:>6} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+                              f"{r['p99_ms']:>9.3f} {r['max_ms']:>9.3f} {r.get('queries', ''):>8}")
+
+        parameters = {k: options[k] for k in ('mountains', 'badges', 'users', 'photos', 'images',
+                                              'image_size', 'queries', 'repeat', 'seed')}
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results, parameters)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}."))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline is None:
+            self.stdout.write(f"No baseline at {options['baseline']}; store one with --save-baseline.")
+            return
+        if baseline['parameters'] != parameters:
+            self.stderr.write(self.style.WARNING(
+                f"Baseline was recorded with different parameters: {baseline['parameters']}"
+            ))
+        regressions = compare(results, baseline['results'], options['tolerance'])
+        if regressions:
+            for message in regressions:
+                self.stderr.write(self.style.ERROR(f"REGRESSION {message}"))
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline.", returncode=1)
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def seed(self, options):
+        """
+        Creates the synthetic catalog, badges, users and their verified photo history.
+        """
+        rng = self.rng
+        Mountain.objects.bulk_create(
+            [Mountain(name=f"Peak {i}", latitude=rng.uniform(*LAT_RANGE), longitude=rng.uniform(*LON_RANGE),
+                      altitude=rng.randint(300, 2600), radius=rng.choice((100, 200, 300, 500)))
+             for i in range(options['mountains'])],
+            batch_size=1000,
+        )
+        mountain_ids = list(Mountain.objects.values_list('id', flat=True))
+
+        badges = Badge.objects.bulk_create(
+            [Badge(name=f"Badge {i}") for i in range(options['badges'])], batch_size=1000
+        )
+        Badge.mountains.through.objects.bulk_create(
+            [Badge.mountains.through(badge_id=badge.id, mountain_id=mountain_id)
+             for badge in badges
+             for mountain_id in rng.sample(mountain_ids, min(len(mountain_ids), rng.randint(5, 30)))],
+            batch_size=1000,
+        )
+
+        users = [User.objects.create_user(f"bench{i}", password='bench') for i in range(options['users'])]
+        coordinates = {m_id: (lat, lon) for m_id, lat, lon in
+                       Mountain.objects.values_list('id', 'latitude', 'longitude')}
+        now = timezone.now()
+        for user in users:
+            # Repeat visits are common: draw from a few hundred favourite peaks
+            favourites = rng.sample(mountain_ids, min(len(mountain_ids), 300))
+            photos = []
+            for _ in range(options['photos']):
+                mountain_id = rng.choice(favourites)
+                photos.append(Photo(
+                    user=user, image='peaks/benchmark.jpg', status=Photo.Status.VERIFIED,
+                    matched_mountain_id=mountain_id, latitude=coordinates[mountain_id][0],
+                    longitude=coordinates[mountain_id][1],
+                ))
+            Photo.objects.bulk_create(photos, batch_size=1000)
+        # auto_now_add gives every row the same timestamp; spread them out like a real history
+        Photo.objects.bulk_update(
+            [Photo(id=photo_id, uploaded_at=now - timedelta(minutes=photo_id))
+             for photo_id in Photo.objects.values_list('id', flat=True)],
+            ['uploaded_at'], batch_size=1000,
+        )
+        rebuild_progress()
+        return users
+
+    def run_benchmarks(self, options):
+        rng = self.rng
+        self.stdout.write("Seeding the benchmark database...")
+        users = self.seed(options)
+        catalog = get_catalog()
+
+        width, height = (int(v) for v in options['image_size'].lower().split('x'))
+        self.stdout.write(f"Generating {options['images']} {width}x{height} JPEG(s)...")
+        targets = rng.sample(catalog.mountains, min(len(catalog.mountains), options['images']))
+        images = [phone_sized_jpeg(width, height, m.latitude, m.longitude) for m in targets]
+
+        results = {}
+        self.stdout.write("Running benchmarks...")
+
+        results['get_exif_data'] = measure(
+            get_exif_data, [(io.BytesIO(data),) for data in images for _ in range(options['repeat'])]
+        )
+
+        # Half the lookups sit right on a peak, half are random points (mostly misses)
+        points = []
+        for _ in range(options['queries']):
+            if rng.random() < 0.5:
+                m = rng.choice(catalog.mountains)
+                points.append((m.latitude + rng.uniform(-0.0005, 0.0005), m.longitude))
+            else:
+                points.append((rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)))
+        results['check_proximity'] = measure(
+            lambda lat, lon: check_proximity(lat, lon, catalog.index), points
+        )
+        results['nearest_mountains'] = measure(
+            lambda lat, lon: nearest_mountains(lat, lon, catalog.nearest, 3), points
+        )
+
+        visited = [list(user.mountain_visits.values_list('mountain_id', flat=True)) for user in users]
+        results['calculate_badge_stats'] = measure(
+            lambda ids: [calculate_badge_stats(badge, current, total)
+                         for badge, current, total in catalog.badge_index.progress(ids)],
+            [(ids,) for ids in visited for _ in range(options['repeat'])],
+        )
+
+        client = Client()
+        client.force_login(users[0])
+
+        def upload(data):
+            response = client.post('/upload/', {'image': SimpleUploadedFile('summit.jpg', data, 'image/jpeg')})
+            assert response.status_code == 302, "benchmark upload was rejected"
+        results['upload_photo'] = measure(upload, [(data,) for data in images], count_queries=True)
+
+        def profile(cold):
+            if cold:
+                bump_progress_version(users[0].id)
+            assert client.get('/').status_code == 200
+        results['profile_cold'] = measure(profile, [(True,)] * options['repeat'], count_queries=True)
+        results['profile_warm'] = measure(profile, [(False,)] * options['repeat'], count_queries=True)
+
+        cursor = client.get('/photos/', {'format': 'json'}).json()['next_cursor']
+        # With fewer photos than one page there is no second page; the first one is measured
+        page = {'cursor': cursor} if cursor else {}
+        results['photo_history_page'] = measure(
+            lambda: client.get('/photos/', page), [()] * options['repeat'], count_queries=True
+        )
+
+        admin_client = Client()
+        admin_client.force_login(User.objects.create_superuser('bench-admin', password='bench'))
+        badge_id = Badge.objects.values_list('id', flat=True).first()
+
+        def admin_page(url):
+            assert admin_client.get(url).status_code == 200, f"admin page {url} failed"
+        for name, url in ADMIN_PAGES.items():
+            results[name] = measure(admin_page, [(url.format(badge_id=badge_id),)] * options['repeat'],
+                                    count_queries=True)
+        return results
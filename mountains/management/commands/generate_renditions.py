@@ -0,0 +1,18 @@
+# mountains/management/commands/generate_renditions.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from mountains.jobs import enqueue
+from mountains.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Queues rendition jobs for photos that don't have their thumbnail/preview yet."
+
+    def handle(self, *args, **options):
+        missing = Photo.objects.filter(Q(thumbnail='') | Q(preview='')).values_list('id', flat=True)
+        count = 0
+        for photo_id in missing.iterator():
+            enqueue('mountains.renditions.generate_renditions_job', photo_id=photo_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued {count} rendition job(s); run the worker to process them."))
@@ -0,0 +1,72 @@
+# mountains/management/commands/import_catalog.py
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mountains.importers import import_catalog
+
+# Invalid rows reported individually before the output is summarized
+MAX_REPORTED_ERRORS = 10
+
+
+def peak_rss_mib():
+    """
+    Peak resident memory of this process so far, in MiB.
+    (tracemalloc would be more precise but slows the import down several times.)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports or refreshes mountains from a GeoJSON (.geojson, or .geojsonl one feature per line) "
+        "or CSV file, matched by external id. Optionally (re)defines badges from a membership CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Mountain dataset (.geojson, .json, .geojsonl, .ndjson or .csv).")
+        parser.add_argument('--memberships',
+                            help="CSV with columns badge, name, description, mountain (external ids).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows per INSERT ... ON CONFLICT statement.")
+
+    def handle(self, *args, **options):
+        errors = []
+
+        def on_error(line, error):
+            errors.append(error)
+            if len(errors) <= MAX_REPORTED_ERRORS:
+                self.stderr.write(f"Skipped record {line}: {error}")
+
+        start = time.perf_counter()
+        try:
+            stats = import_catalog(options['path'], options['memberships'], options['batch_size'], on_error)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['written']} mountain(s) from {stats['read']} record(s), "
+            f"{stats['skipped']} skipped."
+        ))
+        if options['memberships']:
+            self.stdout.write(f"Refreshed {stats['badges']} badge(s) with {stats['links']} mountain link(s).")
+            if stats['unknown_mountains']:
+                self.stderr.write(f"{len(stats['unknown_mountains'])} unknown mountain id(s) in memberships, "
+                                  f"e.g. {', '.join(stats['unknown_mountains'][:5])}")
+        peak = peak_rss_mib()
+        self.stdout.write(
+            f"{stats['read'] / elapsed if elapsed else 0:.0f} rows/s, {elapsed:.2f} s total"
+            + (f", peak memory (RSS) {peak:.0f} MiB" if peak is not None else "")
+        )
+        self.stdout.write("If existing peaks moved or their radius changed, run `rematch_photos` next.")
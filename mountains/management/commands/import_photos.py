@@ -0,0 +1,80 @@
+# mountains/management/commands/import_photos.py
+import csv
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from mountains.importers import DUPLICATE, IMPORTED, REJECTED, import_photo_archive
+from mountains.management.commands.import_catalog import MAX_REPORTED_ERRORS, peak_rss_mib
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a user's photo archive (a directory or a .zip file): reads the GPS position "
+        "of every photo in parallel, matches them against the catalog and creates verified "
+        "photos for the ones taken on a summit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Directory or ZIP archive with the photos.")
+        parser.add_argument('--user', required=True, help="Username the photos are imported for.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Reading processes; 1 reads in the current process.")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Files per worker task and per bulk INSERT.")
+        parser.add_argument('--report', help="Write the outcome of every file to this CSV file.")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f"{options['path']} does not exist.")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']!r}.")
+
+        report_file = open(options['report'], 'w', encoding='utf-8', newline='') if options['report'] else None
+        writer = csv.writer(report_file) if report_file else None
+        if writer:
+            writer.writerow(['file', 'outcome', 'detail'])
+        rejected = 0
+
+        def report(name, outcome, detail):
+            nonlocal rejected
+            if writer:
+                writer.writerow([name, outcome, detail])
+            if outcome == REJECTED:
+                rejected += 1
+                if rejected <= MAX_REPORTED_ERRORS and not writer:
+                    self.stderr.write(f"Rejected {name}: {detail}")
+
+        start = time.perf_counter()
+        try:
+            stats = import_photo_archive(
+                options['path'], user,
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                report=report,
+            )
+        finally:
+            if report_file:
+                report_file.close()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats[IMPORTED]} photo(s) from {stats['files']} file(s): "
+            f"{stats[DUPLICATE]} duplicate(s), {stats[REJECTED]} rejected."
+        ))
+        if options['report']:
+            self.stdout.write(f"Per-file report written to {options['report']}.")
+        elif stats[REJECTED] > MAX_REPORTED_ERRORS:
+            self.stdout.write("Use --report to get the outcome of every file.")
+        peak = peak_rss_mib()
+        self.stdout.write(
+            f"{stats['files'] / elapsed if elapsed else 0:.0f} files/s, "
+            f"{stats['bytes'] / 2**20 / elapsed if elapsed else 0:.1f} MiB/s, {elapsed:.2f} s total"
+            + (f", peak memory (RSS) {peak:.0f} MiB" if peak is not None else "")
+        )
+        if stats[IMPORTED]:
+            self.stdout.write("Run the worker to generate the thumbnails of the new photos.")
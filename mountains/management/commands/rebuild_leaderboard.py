@@ -0,0 +1,29 @@
+# mountains/management/commands/rebuild_leaderboard.py
+from django.core.management.base import BaseCommand, CommandError
+
+from mountains.leaderboard import rebuild_scores, scores_drift
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the leaderboard counters (UserScore) from the visit and badge progress "
+        "tables. Meant to run periodically (e.g. nightly from cron) to correct any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild this user id (repeatable).")
+        parser.add_argument('--check', action='store_true',
+                            help="Only compare the stored counters with a fresh computation; exit 1 on drift.")
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        drift = scores_drift(user_ids)
+        if options['check']:
+            if drift:
+                raise CommandError(f"{drift} user(s) have drifted leaderboard counters.", returncode=1)
+            self.stdout.write(self.style.SUCCESS("Leaderboard counters are consistent."))
+            return
+
+        rebuild_scores(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt leaderboard counters ({drift} user(s) had drifted)."))
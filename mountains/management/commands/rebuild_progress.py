@@ -0,0 +1,45 @@
+# mountains/management/commands/rebuild_progress.py
+from django.core.management.base import BaseCommand, CommandError
+
+from mountains.models import UserBadgeProgress, UserMountainVisit
+from mountains.progress import compute_progress, rebuild_progress
+
+
+def as_keys(visits, progress):
+    return (
+        {(v.user_id, v.mountain_id, v.first_visited_at, v.photo_count) for v in visits},
+        {(p.user_id, p.badge_id, p.visited_count) for p in progress if p.visited_count},
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the UserMountainVisit and UserBadgeProgress tables from verified photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild this user id (repeatable).")
+        parser.add_argument('--check', action='store_true',
+                            help="Only compare the stored rows with a fresh computation; exit 1 on drift.")
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+
+        if options['check']:
+            visits = UserMountainVisit.objects.all()
+            progress = UserBadgeProgress.objects.all()
+            if user_ids:
+                visits = visits.filter(user_id__in=user_ids)
+                progress = progress.filter(user_id__in=user_ids)
+
+            stored_visits, stored_progress = as_keys(visits, progress)
+            fresh_visits, fresh_progress = as_keys(*compute_progress(user_ids))
+            drift = len(stored_visits ^ fresh_visits) + len(stored_progress ^ fresh_progress)
+            if drift:
+                raise CommandError(f"{drift} row(s) differ from the photo history.", returncode=1)
+            self.stdout.write(self.style.SUCCESS("Materialized progress is consistent."))
+            return
+
+        visits, progress = rebuild_progress(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(visits)} visit(s) and {len(progress)} badge progress row(s)."
+        ))
@@ -0,0 +1,33 @@
+# mountains/management/commands/rematch_photos.py
+import os
+
+from django.core.management.base import BaseCommand
+
+from mountains.rematch import rematch_photos
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-matches stored photo positions against the current mountain catalog "
+        "(after coordinates or radii were edited). Interrupted runs resume from their checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--near', type=int, action='append', dest='near',
+                            help="Only photos matched to or located around this mountain id (repeatable).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Matching processes; 1 matches in the current process.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Photos per matching task, write-back and checkpoint.")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore a saved checkpoint and start from the first photo.")
+
+    def handle(self, *args, **options):
+        checked, changed = rematch_photos(
+            near_ids=options['near'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            restart=options['restart'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Re-matched {checked} photo(s), {changed} changed."))
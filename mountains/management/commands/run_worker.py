@@ -0,0 +1,62 @@
+# mountains/management/commands/run_worker.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from mountains.jobs import claim_job, run_job, run_pending
+
+
+class Command(BaseCommand):
+    help = "Processes background jobs (photo verification etc.) from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOB_WORKERS', 2),
+                            help="Number of worker threads.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = run_pending()
+            self.stdout.write(f"Processed {processed} job(s).")
+            return
+
+        stop = threading.Event()
+        self.stdout.write(f"Worker started with {options['workers']} thread(s). Ctrl+C to stop.")
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in range(options['workers']):
+                pool.submit(self.work, stop, options['poll_interval'])
+            try:
+                while not stop.is_set():
+                    stop.wait(1)
+            except KeyboardInterrupt:
+                # Threads finish the job they are running, then exit
+                stop.set()
+
+    def work(self, stop, poll_interval):
+        """
+        Loop of a single worker thread: claim, run, sleep when idle.
+        """
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                job = claim_job()
+                if job is None:
+                    stop.wait(poll_interval)
+                    continue
+                # Finished jobs are deleted, so describe the job beforehand
+                label = str(job)
+                ok = run_job(job)
+            except Exception as e:
+                # Usually a transient DB error (e.g. SQLite "database is locked"); keep going
+                self.stderr.write(f"Worker error: {e}")
+                stop.wait(poll_interval)
+                continue
+            self.stdout.write(f"{'done' if ok else 'failed'}: {label}")
+        # Each thread has its own DB connection
+        connection.close()
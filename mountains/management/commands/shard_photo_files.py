@@ -0,0 +1,90 @@
+# mountains/management/commands/shard_photo_files.py
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mountains.models import Photo
+from mountains.progress import bump_progress_version
+from mountains.storage import SHARDED_NAME, file_sha256, sharded_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves photos stored in the old flat peaks/ directory to content-addressed, "
+        "sharded paths (peaks/ab/cd/<sha256>.<ext>), one batch of photos at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Photos per batch (one transaction each).")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the photos that would be moved.")
+
+    def handle(self, *args, **options):
+        legacy = Photo.objects.exclude(image='').exclude(image__regex=SHARDED_NAME.pattern)
+        if options['dry_run']:
+            self.stdout.write(f"{legacy.count()} photo(s) to move.")
+            return
+
+        totals = {'photos': 0, 'files': 0, 'missing': 0}
+        last_id = 0
+        while True:
+            # Keyset over ids: moved rows drop out of the filter, and rows whose file
+            # is missing are stepped over instead of being selected again
+            batch = list(
+                legacy.filter(id__gt=last_id).order_by('id')
+                .values('id', 'user_id', 'image', 'content_hash')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            stats = self.move_batch(batch)
+            for key, value in stats.items():
+                totals[key] += value
+            self.stdout.write(f"... up to photo {last_id}: {totals['photos']} photo(s), {totals['files']} file(s) moved")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {totals['files']} file(s) referenced by {totals['photos']} photo(s)."
+        ))
+        if totals['missing']:
+            self.stderr.write(f"{totals['missing']} file(s) were missing from storage and were left as they are.")
+
+    def move_batch(self, batch):
+        """
+        Copies each distinct file of the batch to its sharded name, repoints every
+        photo referencing it, and deletes the old file once that has committed.
+        A crash at any point leaves each photo pointing at a complete file; at worst
+        an old or new copy stays behind unreferenced.
+        """
+        stats = {'photos': 0, 'files': 0, 'missing': 0}
+        moves = {}  # old name -> (new name, content hash)
+        for row in batch:
+            old = row['image']
+            if old in moves:
+                continue
+            if not default_storage.exists(old):
+                stats['missing'] += 1
+                continue
+            with default_storage.open(old) as f:
+                content_hash = row['content_hash'] or file_sha256(f)
+                new = sharded_name(content_hash, old)
+                # Identical files uploaded before deduplication collapse into one
+                if not default_storage.exists(new):
+                    default_storage.save(new, f)
+            moves[old] = (new, content_hash)
+
+        with transaction.atomic():
+            user_ids = set()
+            for old, (new, content_hash) in moves.items():
+                # Every photo sharing the file, not only the ones in this batch
+                user_ids.update(Photo.objects.filter(image=old).values_list('user_id', flat=True))
+                stats['photos'] += Photo.objects.filter(image=old).update(image=new)
+                Photo.objects.filter(image=new, content_hash='').update(content_hash=content_hash)
+
+            def after_commit():
+                for old in moves:
+                    default_storage.delete(old)
+                # Cached profile pages contain the old image URLs
+                for user_id in user_ids:
+                    bump_progress_version(user_id)
+            transaction.on_commit(after_commit)
+        stats['files'] = len(moves)
+        return stats
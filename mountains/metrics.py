@@ -0,0 +1,240 @@
+# mountains/metrics.py
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('mountains.metrics')
+
+# Prometheus' default buckets (seconds)
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Every metric registers itself here, in definition order, for render_text()
+REGISTRY = []
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels. Process-local and thread-safe.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """
+    Prometheus-style histogram (cumulative buckets, sum and count) per label set.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One counter per bucket, then +Inf; sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+REQUEST_SECONDS = Histogram('odznaki_request_duration_seconds', "Time spent handling a request.", ['view'])
+REQUEST_QUERIES = Histogram('odznaki_request_db_queries', "SQL queries run by a request.", ['view'], QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('odznaki_request_db_duration_seconds', "Time a request spent in SQL queries.", ['view'])
+STAGE_SECONDS = Histogram('odznaki_stage_duration_seconds', "Time spent in an instrumented stage.", ['stage'])
+STAGE_QUERIES = Histogram('odznaki_stage_db_queries', "SQL queries run by an instrumented stage.", ['stage'], QUERY_BUCKETS)
+STAGE_DB_SECONDS = Histogram('odznaki_stage_db_duration_seconds', "Time a stage spent in SQL queries.", ['stage'])
+UPLOAD_BYTES = Counter('odznaki_upload_bytes_total', "Bytes of uploaded photo files received.")
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper() callback counting the queries and their time.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestMetrics:
+    """
+    Breakdown of the request being handled: stages in completion order and bytes read.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.bytes_read = 0
+
+
+_current = contextvars.ContextVar('mountains_request_metrics', default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a block of code and counts the SQL it runs. The numbers go to the stage
+    histograms and, during a request, to its breakdown for the slow-request log.
+    Stages may be nested; an outer stage includes its inner ones. In async code
+    only queries run on the current thread are counted; awaited async ORM calls
+    show up in the request totals instead.
+    """
+    queries = QueryCounter()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(queries):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        STAGE_QUERIES.observe(queries.count, stage=name)
+        STAGE_DB_SECONDS.observe(queries.seconds, stage=name)
+        current = _current.get()
+        if current is not None:
+            current.stages.append((name, elapsed, queries.count, queries.seconds))
+
+
+def add_bytes_read(amount):
+    UPLOAD_BYTES.inc(amount)
+    current = _current.get()
+    if current is not None:
+        current.bytes_read += amount
+
+
+def render_text():
+    """
+    All metrics of this process in the Prometheus text exposition format.
+    """
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Measures every request (duration, query count and time) per URL name and logs
+    requests slower than settings.SLOW_REQUEST_SECONDS with their stage breakdown.
+    Works in both sync and async middleware chains, so async views stay async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current = RequestMetrics()
+        token = _current.set(current)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+        self.record(request, elapsed, queries, current)
+        return response
+
+    async def __acall__(self, request):
+        current = RequestMetrics()
+        token = _current.set(current)
+        queries = QueryCounter()
+        # The async ORM runs queries in the request's thread-sensitive sync thread,
+        # so the counter is installed on that thread's connection (looked up there,
+        # not on the event loop thread, whose connection the views never use)
+        await sync_to_async(lambda: connection.execute_wrappers.append(queries))()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            await sync_to_async(lambda: connection.execute_wrappers.remove(queries))()
+            _current.reset(token)
+        self.record(request, elapsed, queries, current)
+        return response
+
+    def record(self, request, elapsed, queries, current):
+        view = getattr(request.resolver_match, 'url_name', None) or 'unresolved'
+        REQUEST_SECONDS.observe(elapsed, view=view)
+        REQUEST_QUERIES.observe(queries.count, view=view)
+        REQUEST_DB_SECONDS.observe(queries.seconds, view=view)
+
+        threshold = getattr(settings, 'SLOW_REQUEST_SECONDS', None)
+        if threshold is not None and elapsed >= threshold:
+            breakdown = ', '.join(
+                f"{name} {seconds * 1000:.1f}ms/{count}q" for name, seconds, count, _ in current.stages
+            ) or 'no stages'
+            logger.warning(
+                "Slow request %s %s (%s): %.1fms, %d queries in %.1fms, %d bytes read; %s",
+                request.method, request.path, view, elapsed * 1000, queries.count,
+                queries.seconds * 1000, current.bytes_read, breakdown,
+            )
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_photos_verified(apps, schema_editor):
+    # Photos uploaded before the background pipeline were verified synchronously
+    Photo = apps.get_model('mountains', 'Photo')
+    Photo.objects.update(status='verified')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0002_alter_mountain_altitude_alter_mountain_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='rejection_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_photos_verified, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=200)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='mountains_j_status_c5f025_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def backfill_progress(apps, schema_editor):
+    # Same computation as mountains.progress.compute_progress, on historical models
+    Photo = apps.get_model('mountains', 'Photo')
+    Badge = apps.get_model('mountains', 'Badge')
+    UserMountainVisit = apps.get_model('mountains', 'UserMountainVisit')
+    UserBadgeProgress = apps.get_model('mountains', 'UserBadgeProgress')
+
+    rows = (
+        Photo.objects.filter(status='verified', matched_mountain__isnull=False)
+        .values('user_id', 'matched_mountain_id')
+        .annotate(first=Min('uploaded_at'), count=Count('id'))
+    )
+    visits = [
+        UserMountainVisit(user_id=row['user_id'], mountain_id=row['matched_mountain_id'],
+                          first_visited_at=row['first'], photo_count=row['count'])
+        for row in rows
+    ]
+    UserMountainVisit.objects.bulk_create(visits, batch_size=1000)
+
+    badges_by_mountain = {}
+    for badge_id, mountain_id in Badge.mountains.through.objects.values_list('badge_id', 'mountain_id'):
+        badges_by_mountain.setdefault(mountain_id, []).append(badge_id)
+    counts = {}
+    for visit in visits:
+        for badge_id in badges_by_mountain.get(visit.mountain_id, []):
+            counts[visit.user_id, badge_id] = counts.get((visit.user_id, badge_id), 0) + 1
+    UserBadgeProgress.objects.bulk_create(
+        [UserBadgeProgress(user_id=user_id, badge_id=badge_id, visited_count=count)
+         for (user_id, badge_id), count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0003_photo_status_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBadgeProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visited_count', models.PositiveIntegerField(default=0)),
+                ('badge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_progress', to='mountains.badge')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badge_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'badge'), name='unique_user_badge_progress')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserMountainVisit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_visited_at', models.DateTimeField()),
+                ('photo_count', models.PositiveIntegerField(default=0)),
+                ('mountain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='mountains.mountain')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mountain_visits', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'mountain'), name='unique_user_mountain_visit')],
+            },
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:58
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_unlocked_at(apps, schema_editor):
+    # A complete badge was unlocked when the last of its mountains was first visited.
+    # Existing unlocks are marked as seen so they are not announced again.
+    Badge = apps.get_model('mountains', 'Badge')
+    UserMountainVisit = apps.get_model('mountains', 'UserMountainVisit')
+    UserBadgeProgress = apps.get_model('mountains', 'UserBadgeProgress')
+
+    totals = dict(
+        Badge.mountains.through.objects.values('badge_id').annotate(total=Count('mountain_id'))
+        .values_list('badge_id', 'total')
+    )
+    rows = (
+        UserMountainVisit.objects.values('user_id', 'mountain__badges')
+        .annotate(count=Count('id'), last_first_visit=Max('first_visited_at'))
+    )
+    for row in rows:
+        badge_id = row['mountain__badges']
+        if badge_id is not None and row['count'] >= totals.get(badge_id, 0) > 0:
+            UserBadgeProgress.objects.filter(user_id=row['user_id'], badge_id=badge_id).update(
+                unlocked_at=row['last_first_visit'], unlock_seen=True
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0004_user_progress_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbadgeprogress',
+            name='unlock_seen',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='userbadgeprogress',
+            name='unlocked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_unlocked_at, migrations.RunPython.noop),
+    ]
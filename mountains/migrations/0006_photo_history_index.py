@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0005_badge_unlock_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='photo_user_history_idx'),
+        ),
+    ]
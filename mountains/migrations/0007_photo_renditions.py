@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0006_photo_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='preview',
+            field=models.ImageField(blank=True, upload_to='renditions/'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='renditions/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0007_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='mountain',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
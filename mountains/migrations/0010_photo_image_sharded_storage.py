@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:12
+
+import mountains.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0009_photo_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=models.ImageField(upload_to=mountains.storage.photo_upload_to),
+        ),
+    ]
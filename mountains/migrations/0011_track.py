@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0010_photo_image_sharded_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='tracks/%Y/%m/')),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('rejection_reason', models.CharField(blank=True, max_length=255)),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrackVisit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visited_at', models.DateTimeField()),
+                ('mountain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_visits', to='mountains.mountain')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='mountains.track')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('track', 'mountain'), name='unique_track_mountain_visit')],
+            },
+        ),
+    ]
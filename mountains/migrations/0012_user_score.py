@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_scores(apps, schema_editor):
+    # Same computation as leaderboard.compute_scores(), on the historical models
+    UserMountainVisit = apps.get_model('mountains', 'UserMountainVisit')
+    UserBadgeProgress = apps.get_model('mountains', 'UserBadgeProgress')
+    UserScore = apps.get_model('mountains', 'UserScore')
+
+    scores = {
+        user_id: UserScore(user_id=user_id, peak_count=count)
+        for user_id, count in UserMountainVisit.objects.values('user_id').annotate(count=Count('id'))
+        .values_list('user_id', 'count')
+    }
+    unlocked = UserBadgeProgress.objects.filter(unlocked_at__isnull=False)
+    for user_id, count in unlocked.values('user_id').annotate(count=Count('id')).values_list('user_id', 'count'):
+        scores.setdefault(user_id, UserScore(user_id=user_id)).badge_count = count
+    UserScore.objects.bulk_create(scores.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('mountains', '0011_track'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserScore',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('peak_count', models.PositiveIntegerField(default=0)),
+                ('badge_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userbadgeprogress',
+            index=models.Index(fields=['badge', '-visited_count', 'user'], name='progress_badge_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userscore',
+            index=models.Index(fields=['-peak_count', 'user'], name='score_peaks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userscore',
+            index=models.Index(fields=['-badge_count', 'user'], name='score_badges_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mountains', '0012_user_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='photo_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['status', '-uploaded_at', '-id'], name='photo_status_uploaded_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 # mountains/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import photo_upload_to
 
 class Mountain(models.Model):
     name = models.CharField(max_length=100)
@@ -9,6 +12,9 @@ class Mountain(models.Model):
     altitude = models.IntegerField()
     # Radius in meters to determine if a user is "at" the peak
     radius = models.IntegerField(default=200)
+    # Stable id from the source dataset (e.g. "node/123" from OpenStreetMap), used by
+    # `import_catalog` to update peaks in place. Empty for peaks entered by hand.
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"{self.name} ({self.altitude} m)"
@@ -21,14 +27,23 @@ class Badge(models.Model):
     # Many-to-Many: A badge requires a specific set of mountains.
     # 'related_name' allows us to access badges from a mountain instance (mountain.badges.all())
     mountains = models.ManyToManyField(Mountain, related_name='badges')
+    # Stable id used by `import_catalog --memberships`
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     def __str__(self):
         return self.name
 
 class Photo(models.Model):
+    class Status(models.TextChoices):
+        # Accepted upload waiting for the background worker
+        PENDING = 'pending', 'Pending'
+        VERIFIED = 'verified', 'Verified'
+        REJECTED = 'rejected', 'Rejected'
+
     # Links the photo to a specific user
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='peaks/')
+    # Stored under peaks/ab/cd/<sha256>.<ext> (see mountains/storage.py)
+    image = models.ImageField(upload_to=photo_upload_to)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     # Stored separately to preserve location even if Mountain definitions change later
@@ -39,5 +54,167 @@ class Photo(models.Model):
     # SET_NULL ensures photo remains even if the mountain is deleted from DB.
     matched_mountain = models.ForeignKey(Mountain, null=True, blank=True, on_delete=models.SET_NULL)
 
+    # Verification runs in the background (see mountains/verification.py)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    # Validation message shown to the user when the photo was rejected
+    rejection_reason = models.CharField(max_length=255, blank=True)
+
+    # Downscaled WebP copies without EXIF, generated in the background (see mountains/renditions.py).
+    # Empty until the job has run; the templates fall back to the original image.
+    thumbnail = models.ImageField(upload_to='renditions/', blank=True)
+    preview = models.ImageField(upload_to='renditions/', blank=True)
+    # SHA-256 of the uploaded file (see mountains/dedup.py). Identical uploads share
+    # one stored file; empty for photos uploaded before hashing existed.
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's photo history (see mountains/pagination.py)
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='photo_user_history_idx'),
+            # Admin changelist: default ordering and date drill-down, and the status filter
+            models.Index(fields=['-uploaded_at', '-id'], name='photo_uploaded_idx'),
+            models.Index(fields=['status', '-uploaded_at', '-id'], name='photo_status_uploaded_idx'),
+        ]
+
+    def __str__(self):
+        return f"Photo {self.user.username} - {self.matched_mountain}"
+
+class Job(models.Model):
+    """
+    A unit of background work in the DB-backed queue (see mountains/jobs.py).
+    No external broker is needed: workers claim rows with conditional UPDATEs.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        FAILED = 'failed', 'Failed'
+
+    # Dotted path of the function to call, e.g. 'mountains.verification.verify_photo_job'
+    task = models.CharField(max_length=200)
+    # Keyword arguments for the task
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not picked up before this time (used for retries with backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # When a worker claimed the job; stale locks are reclaimed
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll by status and due time
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class Track(models.Model):
+    """
+    An uploaded GPS track (GPX or FIT). Every mountain whose radius the track entered
+    counts as visited, like a verified photo (see mountains/tracks.py).
+    """
+    class Status(models.TextChoices):
+        # Accepted upload waiting for the background worker
+        PENDING = 'pending', 'Pending'
+        PROCESSED = 'processed', 'Processed'
+        REJECTED = 'rejected', 'Rejected'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tracks')
+    file = models.FileField(upload_to='tracks/%Y/%m/')
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    # Why the track couldn't be used (unreadable file, no summit on the way)
+    rejection_reason = models.CharField(max_length=255, blank=True)
+    # Number of track points read from the file
+    point_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Track {self.user.username} ({self.status})"
+
+class TrackVisit(models.Model):
+    """
+    A mountain whose radius a processed track entered.
+    """
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='visits')
+    mountain = models.ForeignKey(Mountain, on_delete=models.CASCADE, related_name='track_visits')
+    # Time of the first track point inside the radius (the upload time for tracks without timestamps)
+    visited_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'mountain'], name='unique_track_mountain_visit'),
+        ]
+
+    def __str__(self):
+        return f"{self.track} - {self.mountain.name}"
+
+class UserMountainVisit(models.Model):
+    """
+    Denormalized "user has climbed this mountain" row, maintained by mountains/progress.py
+    from verified photos and processed tracks so the profile doesn't have to aggregate them.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mountain_visits')
+    mountain = models.ForeignKey(Mountain, on_delete=models.CASCADE, related_name='visits')
+    # Upload time of the earliest verified photo of this mountain, or the track visit
+    # time if a track got there earlier
+    first_visited_at = models.DateTimeField()
+    # Number of verified photos of this mountain
+    photo_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'mountain'], name='unique_user_mountain_visit'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.mountain.name}"
+
+class UserBadgeProgress(models.Model):
+    """
+    Denormalized number of a badge's mountains the user has visited,
+    maintained together with UserMountainVisit.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='badge_progress')
+    badge = models.ForeignKey(Badge, on_delete=models.CASCADE, related_name='user_progress')
+    visited_count = models.PositiveIntegerField(default=0)
+    # Upload time of the photo that completed the badge; None while it is incomplete
+    unlocked_at = models.DateTimeField(null=True, blank=True)
+    # Whether the user has been shown the "badge unlocked" notification
+    unlock_seen = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'badge'], name='unique_user_badge_progress'),
+        ]
+        indexes = [
+            # Per-badge leaderboard (see mountains/leaderboard.py)
+            models.Index(fields=['badge', '-visited_count', 'user'], name='progress_badge_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.badge.name} ({self.visited_count})"
+
+class UserScore(models.Model):
+    """
+    Denormalized leaderboard counters of a user, maintained together with
+    UserMountainVisit and UserBadgeProgress (see mountains/leaderboard.py).
+    Users without any visit have no row.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    # Number of distinct mountains visited (UserMountainVisit rows)
+    peak_count = models.PositiveIntegerField(default=0)
+    # Number of unlocked badges
+    badge_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Top-N and "users ahead of me" counts read these in index order
+            models.Index(fields=['-peak_count', 'user'], name='score_peaks_idx'),
+            models.Index(fields=['-badge_count', 'user'], name='score_badges_idx'),
+        ]
+
     def __str__(self):
-        return f"Photo {self.user.username} - {self.matched_mountain}"
\ No newline at end of file
+        return f"{self.user.username}: {self.peak_count} peaks, {self.badge_count} badges"
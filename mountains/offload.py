@@ -0,0 +1,47 @@
+# mountains/offload.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_image_executor():
+    """
+    The process-wide pool for image work, created on first use with
+    settings.IMAGE_WORK_THREADS threads.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_WORK_THREADS', 4),
+                    thread_name_prefix='mountains-image',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # A catalog reload can open a connection in a pool thread; don't leak it
+        close_old_connections()
+
+
+async def run_image_work(func, *args, **kwargs):
+    """
+    Awaits func(*args, **kwargs) run in the bounded image pool.
+
+    For the CPU-bound and blocking parts of async views (multipart parsing with the
+    EXIF pre-check, hashing, Pillow validation, writing the file). The event loop
+    stays free for other requests, and the pool size caps how many uploads are
+    processed at once no matter how many are connected. Context variables (the
+    request metrics) are carried over to the pool thread.
+    """
+    return await sync_to_async(_run, thread_sensitive=False, executor=get_image_executor())(func, args, kwargs)
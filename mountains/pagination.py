@@ -0,0 +1,117 @@
+# mountains/pagination.py
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Photos rendered per page of the profile history
+PHOTO_PAGE_SIZE = 24
+
+# Below this many rows an exact COUNT(*) is cheap, and exact numbers are nicer
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+Page = namedtuple('Page', 'items next_cursor')
+
+
+def encode_cursor(photo):
+    """
+    Opaque token pointing right after `photo` in (uploaded_at, id) descending order.
+    """
+    raw = f"{photo.uploaded_at.isoformat()}|{photo.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor(). Returns (uploaded_at, id) or raises ValueError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        uploaded_at, photo_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(uploaded_at), int(photo_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def page_queryset(queryset, cursor):
+    """
+    `queryset` ordered by (-uploaded_at, -id) and positioned right after `cursor`.
+
+    Unlike OFFSET, the position is a WHERE condition the (user, -uploaded_at, -id)
+    index can seek to, so every page costs the same no matter how deep it is.
+    The id breaks ties between photos uploaded in the same instant.
+    """
+    queryset = queryset.order_by('-uploaded_at', '-id')
+    if cursor:
+        uploaded_at, photo_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=photo_id)
+        )
+    return queryset
+
+
+def make_page(items, size):
+    # One extra row tells whether another page exists without a COUNT
+    if len(items) > size:
+        items = items[:size]
+        return Page(items, encode_cursor(items[-1]))
+    return Page(items, None)
+
+
+def keyset_page(queryset, cursor=None, size=PHOTO_PAGE_SIZE):
+    """
+    Returns one Page of `queryset` ordered by (-uploaded_at, -id), starting after `cursor`.
+    """
+    return make_page(list(page_queryset(queryset, cursor)[:size + 1]), size)
+
+
+async def akeyset_page(queryset, cursor=None, size=PHOTO_PAGE_SIZE):
+    """
+    Async version of keyset_page().
+    """
+    return make_page([item async for item in page_queryset(queryset, cursor)[:size + 1]], size)
+
+
+def estimated_row_count(model, using='default'):
+    """
+    The planner's row estimate of the model's table (kept up to date by
+    ANALYZE/autovacuum), or None where the database has no cheap estimate.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                           [connection.ops.quote_name(table)])
+        elif connection.vendor == 'mysql':
+            cursor.execute("SELECT table_rows FROM information_schema.tables "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of very large tables.
+
+    An unfiltered list takes its total from the table statistics instead of a
+    COUNT(*) that reads the whole table; the page numbers are then approximate.
+    Filtered lists (and small tables) are counted exactly, which the indexes
+    behind the offered filters keep cheap.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,302 @@
+# mountains/progress.py
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+from django.dispatch import Signal
+
+from .catalog import get_catalog
+from .leaderboard import adjust_score, rebuild_scores
+from .models import Badge, Photo, TrackVisit, UserBadgeProgress, UserMountainVisit
+
+# Per-user counterpart of catalog.CATALOG_VERSION_KEY: changes whenever anything
+# shown on that user's profile (photos, visits, badge progress) changes.
+PROGRESS_VERSION_KEY = 'mountains:progress-version:{user_id}'
+
+# Sent after commit when a verified photo, a processed track or a rebuild completes one
+# or more badges. Arguments: user_id, badges (list of catalog BadgeRecords), photo, track
+# (at most one of them is set; both are None for rebuilds).
+badges_unlocked = Signal()
+
+
+def get_progress_version(user_id):
+    """
+    Returns the user's progress version, creating one if the cache has none yet.
+    """
+    key = PROGRESS_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_progress_version(user_id):
+    """
+    Invalidates everything cached under the user's current progress version.
+    Use transaction.on_commit(), so no reader caches data older than the new version.
+    """
+    cache.set(PROGRESS_VERSION_KEY.format(user_id=user_id), uuid.uuid4().hex, None)
+
+
+def badge_ids_for_mountain(mountain_id):
+    """
+    IDs of all badges that require the given mountain.
+    """
+    return list(Badge.mountains.through.objects.filter(mountain_id=mountain_id).values_list('badge_id', flat=True))
+
+
+def add_visit(user_id, mountain_id, visited_at, photo_count):
+    """
+    Counts a visit of a mountain (a verified photo or a track passing it) in the per-user tables.
+    The first visit of a mountain creates the visit row and advances every badge containing it;
+    later visits only bump the photo counter and move the first visit time back if needed.
+    Returns the badges (catalog BadgeRecords) just unlocked. Call inside a transaction.
+    """
+    visit, created = UserMountainVisit.objects.get_or_create(
+        user_id=user_id,
+        mountain_id=mountain_id,
+        defaults={'first_visited_at': visited_at, 'photo_count': photo_count},
+    )
+    if not created:
+        if photo_count:
+            UserMountainVisit.objects.filter(pk=visit.pk).update(photo_count=F('photo_count') + photo_count)
+        if visited_at < visit.first_visited_at:
+            UserMountainVisit.objects.filter(pk=visit.pk).update(first_visited_at=visited_at)
+        return []
+
+    # Only the badges containing the new mountain can have been completed by it,
+    # so the reverse map spares us from re-evaluating every badge.
+    unlocked = []
+    for badge in get_catalog().badges_by_mountain.get(mountain_id, ()):
+        progress, progress_created = UserBadgeProgress.objects.get_or_create(
+            user_id=user_id, badge_id=badge.id, defaults={'visited_count': 1}
+        )
+        if not progress_created:
+            UserBadgeProgress.objects.filter(pk=progress.pk).update(visited_count=F('visited_count') + 1)
+        completed = UserBadgeProgress.objects.filter(
+            pk=progress.pk, visited_count__gte=len(badge.mountain_ids), unlocked_at__isnull=True
+        ).update(unlocked_at=visited_at, unlock_seen=False)
+        if completed:
+            unlocked.append(badge)
+    adjust_score(user_id, peaks=1, badges=len(unlocked))
+    return unlocked
+
+
+@transaction.atomic
+def record_visit(photo):
+    """
+    Registers a newly verified photo in the per-user tables.
+    Returns the badges (catalog BadgeRecords) this photo has just unlocked.
+    """
+    unlocked = add_visit(photo.user_id, photo.matched_mountain_id, photo.uploaded_at, 1)
+    if unlocked:
+        transaction.on_commit(lambda: badges_unlocked.send(
+            sender=UserBadgeProgress, user_id=photo.user_id, badges=unlocked, photo=photo, track=None
+        ))
+    return unlocked
+
+
+@transaction.atomic
+def record_track_visits(track, visits):
+    """
+    Registers the TrackVisits of a newly processed track in the per-user tables.
+    Returns the badges (catalog BadgeRecords) the track has just unlocked.
+    """
+    unlocked = []
+    for visit in visits:
+        unlocked += add_visit(track.user_id, visit.mountain_id, visit.visited_at, 0)
+    if unlocked:
+        transaction.on_commit(lambda: badges_unlocked.send(
+            sender=UserBadgeProgress, user_id=track.user_id, badges=unlocked, photo=None, track=track
+        ))
+    return unlocked
+
+
+@transaction.atomic
+def remove_visit(user_id, mountain_id):
+    """
+    Reverts add_visit() for a verified photo or a track that was deleted (or re-matched).
+    Must be called once it no longer counts, i.e. after the delete/update.
+    """
+    visit = UserMountainVisit.objects.filter(user_id=user_id, mountain_id=mountain_id).first()
+    if visit is None:
+        # Already gone, e.g. cascaded together with the user or mountain
+        return
+
+    remaining = Photo.objects.filter(
+        user_id=user_id, matched_mountain_id=mountain_id, status=Photo.Status.VERIFIED
+    ).aggregate(count=Count('id'), first=Min('uploaded_at'))
+    track_first = TrackVisit.objects.filter(
+        track__user_id=user_id, mountain_id=mountain_id
+    ).aggregate(first=Min('visited_at'))['first']
+    firsts = [moment for moment in (remaining['first'], track_first) if moment is not None]
+
+    if firsts:
+        UserMountainVisit.objects.filter(pk=visit.pk).update(
+            photo_count=remaining['count'], first_visited_at=min(firsts)
+        )
+        return
+
+    visit.delete()
+    # Losing a mountain makes every badge containing it incomplete again
+    progress = UserBadgeProgress.objects.filter(
+        user_id=user_id, badge_id__in=badge_ids_for_mountain(mountain_id), visited_count__gt=0
+    )
+    lost_badges = progress.filter(unlocked_at__isnull=False).count()
+    progress.update(visited_count=F('visited_count') - 1, unlocked_at=None, unlock_seen=False)
+    adjust_score(user_id, peaks=-1, badges=-lost_badges)
+
+
+def badge_totals(badge_ids=None):
+    """
+    Number of required mountains per badge id, straight from the database.
+    """
+    links = Badge.mountains.through.objects.all()
+    if badge_ids is not None:
+        links = links.filter(badge_id__in=badge_ids)
+    return dict(links.values('badge_id').annotate(total=Count('mountain_id')).values_list('badge_id', 'total'))
+
+
+def progress_row(user_id, badge_id, count, last_first_visit, totals):
+    """
+    Builds a UserBadgeProgress row. A complete badge was unlocked when the last
+    of its mountains was first visited, so the timestamp can be derived exactly.
+    Rows are marked as seen; carry_unlocks() flags the badges unlocked by a rebuild.
+    """
+    complete = count >= totals.get(badge_id, 0) > 0
+    return UserBadgeProgress(
+        user_id=user_id, badge_id=badge_id, visited_count=count,
+        unlocked_at=last_first_visit if complete else None, unlock_seen=True,
+    )
+
+
+def carry_unlocks(old_rows, new_rows):
+    """
+    Keeps the unlock time and the seen flag of badges that were already unlocked
+    before a rebuild. Badges the rebuild unlocks (e.g. after a re-match or a catalog
+    change) are left unseen and announced through badges_unlocked after commit.
+    Call before old_rows are deleted.
+    """
+    unlocks = {
+        (user_id, badge_id): (unlocked_at, unlock_seen)
+        for user_id, badge_id, unlocked_at, unlock_seen in old_rows.filter(unlocked_at__isnull=False)
+        .values_list('user_id', 'badge_id', 'unlocked_at', 'unlock_seen')
+    }
+    unlocked = defaultdict(list)
+    for row in new_rows:
+        if row.unlocked_at is None:
+            continue
+        previous = unlocks.get((row.user_id, row.badge_id))
+        if previous:
+            row.unlocked_at, row.unlock_seen = previous
+        else:
+            row.unlock_seen = False
+            unlocked[row.user_id].append(row.badge_id)
+    if unlocked:
+        transaction.on_commit(lambda: announce_unlocks(unlocked))
+
+
+def announce_unlocks(unlocked):
+    # {user_id: [badge_id, ...]} -> one badges_unlocked per user
+    badges = {badge.id: badge for badge in get_catalog().badges}
+    for user_id, badge_ids in unlocked.items():
+        records = [badges[badge_id] for badge_id in badge_ids if badge_id in badges]
+        if records:
+            badges_unlocked.send(sender=UserBadgeProgress, user_id=user_id, badges=records, photo=None, track=None)
+
+
+def compute_progress(user_ids=None):
+    """
+    Recomputes both tables from raw Photo and TrackVisit rows (optionally for some users only).
+    Returns (visits, progress): lists of unsaved model instances.
+    """
+    photos = Photo.objects.filter(status=Photo.Status.VERIFIED, matched_mountain__isnull=False)
+    track_visits = TrackVisit.objects.all()
+    if user_ids is not None:
+        photos = photos.filter(user_id__in=user_ids)
+        track_visits = track_visits.filter(track__user_id__in=user_ids)
+
+    first_visits, photo_counts = {}, {}
+    for row in photos.values('user_id', 'matched_mountain_id').annotate(first=Min('uploaded_at'), count=Count('id')):
+        key = (row['user_id'], row['matched_mountain_id'])
+        first_visits[key] = row['first']
+        photo_counts[key] = row['count']
+    for row in track_visits.values('track__user_id', 'mountain_id').annotate(first=Min('visited_at')):
+        key = (row['track__user_id'], row['mountain_id'])
+        first_visits[key] = min(first_visits.get(key, row['first']), row['first'])
+
+    visits = [
+        UserMountainVisit(user_id=user_id, mountain_id=mountain_id, first_visited_at=first,
+                          photo_count=photo_counts.get((user_id, mountain_id), 0))
+        for (user_id, mountain_id), first in first_visits.items()
+    ]
+
+    badges_by_mountain = defaultdict(list)
+    for badge_id, mountain_id in Badge.mountains.through.objects.values_list('badge_id', 'mountain_id'):
+        badges_by_mountain[mountain_id].append(badge_id)
+
+    counts = defaultdict(int)
+    last_first_visit = {}
+    for visit in visits:
+        for badge_id in badges_by_mountain[visit.mountain_id]:
+            key = (visit.user_id, badge_id)
+            counts[key] += 1
+            last_first_visit[key] = max(last_first_visit.get(key, visit.first_visited_at), visit.first_visited_at)
+
+    totals = badge_totals()
+    progress = [
+        progress_row(user_id, badge_id, count, last_first_visit[user_id, badge_id], totals)
+        for (user_id, badge_id), count in counts.items()
+    ]
+    return visits, progress
+
+
+@transaction.atomic
+def rebuild_progress(user_ids=None, batch_size=1000):
+    """
+    Replaces the materialized rows (and the leaderboard counters) with freshly computed ones.
+    """
+    visits, progress = compute_progress(user_ids)
+    visit_rows = UserMountainVisit.objects.all()
+    progress_rows = UserBadgeProgress.objects.all()
+    if user_ids is not None:
+        visit_rows = visit_rows.filter(user_id__in=user_ids)
+        progress_rows = progress_rows.filter(user_id__in=user_ids)
+
+    affected = set(visit_rows.values_list('user_id', flat=True).distinct()) | {v.user_id for v in visits}
+    transaction.on_commit(lambda: [bump_progress_version(user_id) for user_id in affected])
+
+    carry_unlocks(progress_rows, progress)
+    visit_rows.delete()
+    progress_rows.delete()
+    UserMountainVisit.objects.bulk_create(visits, batch_size=batch_size)
+    UserBadgeProgress.objects.bulk_create(progress, batch_size=batch_size)
+    rebuild_scores(user_ids, batch_size)
+    return visits, progress
+
+
+@transaction.atomic
+def rebuild_badge_progress(badge_ids):
+    """
+    Recomputes UserBadgeProgress of the given badges for every user.
+    Used when a badge's mountain list changes (rare, admin-only operation).
+    """
+    rows = (
+        UserMountainVisit.objects.filter(mountain__badges__in=badge_ids)
+        .values('user_id', 'mountain__badges')
+        .annotate(count=Count('id'), last_first_visit=Max('first_visited_at'))
+    )
+    totals = badge_totals(badge_ids)
+    old_rows = UserBadgeProgress.objects.filter(badge_id__in=badge_ids)
+    # Users who had or now have one of these badges unlocked need new badge counts
+    affected = set(old_rows.filter(unlocked_at__isnull=False).values_list('user_id', flat=True))
+    new_rows = [progress_row(row['user_id'], row['mountain__badges'], row['count'], row['last_first_visit'], totals)
+                for row in rows]
+    carry_unlocks(old_rows, new_rows)
+    old_rows.delete()
+    UserBadgeProgress.objects.bulk_create(new_rows, batch_size=1000)
+    affected.update(row.user_id for row in new_rows if row.unlocked_at)
+    rebuild_scores(affected)
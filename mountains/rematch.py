@@ -0,0 +1,146 @@
+# mountains/rematch.py
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .catalog import get_catalog
+from .models import Photo
+from .progress import rebuild_progress
+from .spatial import radius_bbox
+from .utils import init_match_worker, match_ids
+from .verification import no_match_message
+
+# Where an interrupted run remembers how far it got (shared cache, survives restarts)
+CHECKPOINT_KEY = 'mountains:rematch-checkpoint'
+
+
+def near_filter(mountains):
+    """
+    Q matching photos whose stored position falls in the radius bounding box of any
+    of the given (current) mountain records. Together with the photos currently
+    matched to them, these are the only photos an edit of those mountains can affect.
+    """
+    condition = Q(pk__in=[])
+    for mountain in mountains:
+        lat_min, lat_max, dlon = radius_bbox(mountain)
+        box = Q(latitude__gte=lat_min, latitude__lte=lat_max)
+        if dlon is not None:
+            lon_min, lon_max = mountain.longitude - dlon, mountain.longitude + dlon
+            if lon_min < -180.0:
+                box &= Q(longitude__gte=lon_min + 360.0) | Q(longitude__lte=lon_max)
+            elif lon_max > 180.0:
+                box &= Q(longitude__gte=lon_min) | Q(longitude__lte=lon_max - 360.0)
+            else:
+                box &= Q(longitude__gte=lon_min, longitude__lte=lon_max)
+        condition |= box
+    return condition
+
+
+def photos_to_rematch(catalog, near_ids=None):
+    """
+    Processed photos with a stored position, optionally only around some mountains.
+    Pending photos are left to the verification job.
+    """
+    photos = Photo.objects.filter(
+        status__in=[Photo.Status.VERIFIED, Photo.Status.REJECTED],
+        latitude__isnull=False, longitude__isnull=False,
+    )
+    if near_ids:
+        near = [catalog.mountains_by_id[i] for i in near_ids if i in catalog.mountains_by_id]
+        photos = photos.filter(Q(matched_mountain_id__in=near_ids) | near_filter(near))
+    return photos
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def apply_matches(rows, matches, batch_size, catalog):
+    """
+    Writes back the photos whose match changed. Returns the ids of their owners.
+    """
+    changed = []
+    owners = set()
+    for (photo_id, user_id, lat, lon, old_mountain_id), (_, mountain_id) in zip(rows, matches):
+        if mountain_id == old_mountain_id:
+            continue
+        changed.append(Photo(
+            id=photo_id,
+            matched_mountain_id=mountain_id,
+            status=Photo.Status.VERIFIED if mountain_id else Photo.Status.REJECTED,
+            rejection_reason='' if mountain_id else no_match_message(lat, lon, catalog),
+        ))
+        owners.add(user_id)
+    Photo.objects.bulk_update(changed, ['matched_mountain', 'status', 'rejection_reason'], batch_size=batch_size)
+    return owners, len(changed)
+
+
+def rematch_photos(near_ids=None, workers=2, batch_size=500, restart=False, log=None):
+    """
+    Re-matches stored photo positions against the current catalog, without
+    opening any image. Rows are streamed by ascending id, matched in a process
+    pool and written back batch by batch. After every batch the last id is
+    checkpointed, so an interrupted run resumes where it stopped (as long as the
+    catalog and the options are the same). Returns (photos checked, photos changed).
+    """
+    catalog = get_catalog()
+    near_ids = sorted(near_ids) if near_ids else None
+    checkpoint = cache.get(CHECKPOINT_KEY)
+    if restart or not checkpoint or checkpoint['catalog'] != catalog.version or checkpoint['near'] != near_ids:
+        # Photos of an interrupted run were already written back but their owners'
+        # progress was not rebuilt yet; a fresh run would see those photos as
+        # unchanged, so the owners are carried over.
+        checkpoint = {'catalog': catalog.version, 'near': near_ids, 'last_id': 0,
+                      'checked': 0, 'changed': 0, 'users': checkpoint['users'] if checkpoint else []}
+    elif log:
+        log(f"Resuming after photo #{checkpoint['last_id']}.")
+    owners = set(checkpoint['users'])
+
+    rows = (
+        photos_to_rematch(catalog, near_ids).filter(id__gt=checkpoint['last_id']).order_by('id')
+        .values_list('id', 'user_id', 'latitude', 'longitude', 'matched_mountain_id')
+        .iterator(chunk_size=batch_size)
+    )
+
+    def finish(batch, matches):
+        batch_owners, batch_changed = apply_matches(batch, matches, batch_size, catalog)
+        owners.update(batch_owners)
+        checkpoint.update(
+            last_id=batch[-1][0], checked=checkpoint['checked'] + len(batch),
+            changed=checkpoint['changed'] + batch_changed, users=sorted(owners),
+        )
+        cache.set(CHECKPOINT_KEY, checkpoint, None)
+        if log:
+            log(f"Checked {checkpoint['checked']} photo(s) up to #{checkpoint['last_id']}, "
+                f"{checkpoint['changed']} changed.")
+
+    mountains = [(m.id, m.latitude, m.longitude, m.radius) for m in catalog.mountains]
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_match_worker, initargs=(mountains,)) as pool:
+            # A bounded window of batches in flight keeps memory flat; results are
+            # applied in id order so the checkpoint only ever moves forward.
+            pending = deque()
+            for batch in batches(rows, batch_size):
+                pending.append((batch, pool.submit(match_ids, [(r[0], r[2], r[3]) for r in batch])))
+                if len(pending) >= workers * 2:
+                    done, future = pending.popleft()
+                    finish(done, future.result())
+            while pending:
+                done, future = pending.popleft()
+                finish(done, future.result())
+    else:
+        init_match_worker(mountains)
+        for batch in batches(rows, batch_size):
+            finish(batch, match_ids([(r[0], r[2], r[3]) for r in batch]))
+
+    # bulk_update() bypasses the signals, so the per-user tables are rebuilt here
+    # (which also bumps the owners' progress versions).
+    for chunk in batches(sorted(owners), batch_size):
+        rebuild_progress(chunk)
+    cache.delete(CHECKPOINT_KEY)
+    return checkpoint['checked'], checkpoint['changed']
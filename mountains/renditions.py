@@ -0,0 +1,110 @@
+# mountains/renditions.py
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Photo
+from .progress import bump_progress_version
+
+# Rendition name -> (model field, longest edge in px). Ordered largest first,
+# because each rendition is resized from the previous one.
+RENDITIONS = {
+    'preview': ('preview', 1280),
+    'thumb': ('thumbnail', 480),
+}
+WEBP_QUALITY = 80
+
+
+def fit(size, max_edge):
+    """
+    Scales (width, height) down so that the longer edge is at most max_edge.
+    """
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_reduced(image_file, max_edge):
+    """
+    Opens the photo decoded at the smallest resolution still larger than the
+    biggest rendition, upright and in a WebP-compatible mode.
+
+    For JPEGs draft() makes libjpeg decode at 1/2, 1/4 or 1/8 scale directly,
+    so a 12 MP photo never exists in memory at full size. reduce() then
+    box-averages by an integer factor, which is much cheaper than resampling
+    the whole image with a high-quality filter.
+    """
+    img = Image.open(image_file)
+    target = fit(img.size, max_edge)
+    img.draft('RGB', target)
+    img.load()
+
+    factor = min(img.width // target[0], img.height // target[1])
+    if factor >= 2:
+        # The reduced copy keeps img.info, including the EXIF orientation
+        img = img.reduce(factor)
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in img.mode or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    return img
+
+
+def encode_webp(img):
+    """
+    Encodes an image as WebP. No exif/icc arguments are passed, so the
+    output carries no metadata (in particular no GPS position).
+    """
+    out = io.BytesIO()
+    img.save(out, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def rendition_name(photo, rendition, data):
+    """
+    Immutable storage name: the content hash changes whenever the bytes do,
+    so the files can be served with a far-future Cache-Control.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    return f"renditions/{digest[:2]}/{photo.id}-{rendition}-{digest}.webp"
+
+
+def generate_renditions(photo):
+    """
+    Creates every missing rendition of the photo and returns the updated field names.
+    """
+    missing = {name: spec for name, spec in RENDITIONS.items() if not getattr(photo, spec[0])}
+    if not missing:
+        return []
+
+    with photo.image.open('rb') as image_file:
+        img = load_reduced(image_file, max(edge for _, edge in missing.values()))
+
+    updated = []
+    for rendition, (field, max_edge) in missing.items():
+        img.thumbnail(fit(img.size, max_edge), Image.Resampling.LANCZOS)
+        data = encode_webp(img)
+        name = rendition_name(photo, rendition, data)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        getattr(photo, field).name = name
+        updated.append(field)
+    return updated
+
+
+def generate_renditions_job(photo_id):
+    """
+    Background job (see mountains/jobs.py) enqueued for every accepted upload.
+    """
+    photo = Photo.objects.filter(id=photo_id).first()
+    if photo is None:
+        return
+    updated = generate_renditions(photo)
+    if updated:
+        # Only the rendition columns, so a concurrent verification update isn't overwritten
+        Photo.objects.filter(id=photo.id).update(**{field: getattr(photo, field).name for field in updated})
+        bump_progress_version(photo.user_id)
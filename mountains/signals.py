@@ -0,0 +1,156 @@
+# mountains/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .leaderboard import rebuild_scores
+from .models import Mountain, Badge, Photo, Track, UserBadgeProgress, UserMountainVisit
+from .progress import (
+    badge_ids_for_mountain, bump_progress_version, rebuild_badge_progress, record_visit, remove_visit,
+)
+
+
+@receiver(post_save, sender=Mountain)
+@receiver(post_delete, sender=Mountain)
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+@receiver(m2m_changed, sender=Badge.mountains.through)
+def invalidate_catalog(sender, **kwargs):
+    """
+    Any change to mountains, badges or badge membership makes the cached catalog stale.
+    The version is bumped only after the transaction commits, so other workers
+    never reload a catalog that does not contain the change yet.
+    """
+    # m2m_changed fires both before and after each change; the "post_" event is enough.
+    if kwargs.get('action', 'post').startswith('pre'):
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def invalidate_user_progress(sender, instance, **kwargs):
+    """
+    Uploads, deletions and admin edits of a photo change its owner's profile.
+    (Queryset updates, used by the background jobs, bump the version themselves.)
+    """
+    transaction.on_commit(lambda: bump_progress_version(instance.user_id))
+
+
+def counted_visit(photo):
+    # The (user, mountain) a photo counts as a visit of, if any
+    if photo.status == Photo.Status.VERIFIED and photo.matched_mountain_id:
+        return photo.user_id, photo.matched_mountain_id
+    return None
+
+
+@receiver(pre_save, sender=Photo)
+def remember_photo_visit(sender, instance, **kwargs):
+    # What the stored row counted before an edit (e.g. in the admin) changes it
+    old = None
+    if instance.pk:
+        old = Photo.objects.filter(pk=instance.pk).only('user_id', 'status', 'matched_mountain_id').first()
+    instance._counted_visit = counted_visit(old) if old else None
+
+
+@receiver(post_save, sender=Photo)
+def update_photo_visit(sender, instance, raw=False, **kwargs):
+    """
+    A saved photo whose status, match or owner changed moves its visit in the
+    per-user tables, in the same transaction. (The verification job counts its
+    photos itself, after a queryset update.)
+    """
+    old, new = getattr(instance, '_counted_visit', None), counted_visit(instance)
+    if raw or old == new:
+        return
+    if old:
+        remove_visit(*old)
+        if old[0] != instance.user_id:
+            transaction.on_commit(lambda: bump_progress_version(old[0]))
+    if new:
+        record_visit(instance)
+
+
+@receiver(post_delete, sender=Photo)
+def remove_photo_visit(sender, instance, **kwargs):
+    """
+    A deleted verified photo may have been the user's only proof of a summit.
+    """
+    if instance.status == Photo.Status.VERIFIED and instance.matched_mountain_id:
+        remove_visit(instance.user_id, instance.matched_mountain_id)
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+def invalidate_track_owner_progress(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_progress_version(instance.user_id))
+
+
+@receiver(pre_delete, sender=Track)
+def remember_track_mountains(sender, instance, **kwargs):
+    # The TrackVisits are deleted together with the track, without their own signals
+    instance._mountain_ids = list(instance.visits.values_list('mountain_id', flat=True))
+
+
+@receiver(post_delete, sender=Track)
+def remove_track_visits(sender, instance, **kwargs):
+    """
+    A deleted track may have been the user's only proof of some summits.
+    """
+    for mountain_id in getattr(instance, '_mountain_ids', []):
+        remove_visit(instance.user_id, mountain_id)
+
+
+@receiver(m2m_changed, sender=Badge.mountains.through)
+def refresh_badge_progress(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Changing which mountains a badge requires changes every user's progress on it.
+    """
+    if action == 'pre_clear' and reverse:
+        # mountain.badges.clear(): remember the badges before the links disappear
+        instance._cleared_badge_ids = badge_ids_for_mountain(instance.pk)
+        return
+    if not action.startswith('post'):
+        return
+
+    if not reverse:
+        badge_ids = [instance.pk]
+    elif action == 'post_clear':
+        badge_ids = getattr(instance, '_cleared_badge_ids', [])
+    else:
+        badge_ids = list(pk_set)
+    if badge_ids:
+        rebuild_badge_progress(badge_ids)
+
+
+@receiver(pre_delete, sender=Mountain)
+def remember_mountain_badges(sender, instance, **kwargs):
+    # The badge links and visits are deleted together with the mountain, without signals
+    instance._badge_ids = badge_ids_for_mountain(instance.pk)
+    instance._visitor_ids = list(UserMountainVisit.objects.filter(mountain=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Mountain)
+def refresh_progress_after_mountain_delete(sender, instance, **kwargs):
+    badge_ids = getattr(instance, '_badge_ids', [])
+    if badge_ids:
+        rebuild_badge_progress(badge_ids)
+    visitor_ids = getattr(instance, '_visitor_ids', [])
+    if visitor_ids:
+        # The visitors lost a peak on the leaderboard
+        rebuild_scores(visitor_ids)
+
+
+@receiver(pre_delete, sender=Badge)
+def remember_badge_holders(sender, instance, **kwargs):
+    # The progress rows are deleted together with the badge, without signals
+    instance._holder_ids = list(UserBadgeProgress.objects.filter(badge=instance, unlocked_at__isnull=False)
+                                .values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Badge)
+def refresh_scores_after_badge_delete(sender, instance, **kwargs):
+    holder_ids = getattr(instance, '_holder_ids', [])
+    if holder_ids:
+        rebuild_scores(holder_ids)
@@ -0,0 +1,259 @@
+# mountains/spatial.py
+import math
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+# Shortest length of one degree of latitude on the WGS84 ellipsoid (at the equator).
+# Dividing a radius by the *shortest* degree gives the *widest* span in degrees,
+# so the bounding boxes below are always a superset of the real circle.
+METERS_PER_DEG_LAT = 110574.0
+# Length of one degree of longitude at the equator; it shrinks with cos(latitude).
+METERS_PER_DEG_LON = 111320.0
+# Extra slack on every bounding box to absorb floating point and ellipsoid rounding.
+SAFETY_MARGIN = 1.01
+# Mean Earth radius used by the haversine distances (meters).
+EARTH_RADIUS = 6371008.8
+
+
+def radius_bbox(mountain):
+    """
+    Bounding box of the mountain's verification circle: (lat_min, lat_max, dlon),
+    dlon being the half-width in degrees of longitude, or None when the circle
+    reaches around a pole and spans every meridian.
+    """
+    radius = mountain.radius * SAFETY_MARGIN
+    dlat = radius / METERS_PER_DEG_LAT
+    lat_min = max(mountain.latitude - dlat, -90.0)
+    lat_max = min(mountain.latitude + dlat, 90.0)
+
+    # Longitude degrees are shortest at the edge of the box closest to a pole.
+    cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if cos_lat * METERS_PER_DEG_LON * 180.0 <= radius:
+        return lat_min, lat_max, None
+    return lat_min, lat_max, radius / (METERS_PER_DEG_LON * cos_lat)
+
+
+class MountainIndex:
+    """
+    Uniform lat/lon grid over the mountain catalog.
+
+    Every mountain is registered in each grid cell that its verification circle
+    (centre + radius) could touch. A photo point therefore only needs to look at
+    the single cell it falls into, so a lookup costs the same whether the catalog
+    holds 28 peaks or 100 000.
+
+    Items can be Mountain instances or any object exposing
+    `latitude`, `longitude` and `radius` (in meters).
+    """
+
+    # ~5.5 km along a meridian. Small enough that a cell holds only a handful of
+    # peaks, large enough that a 200 m circle usually lands in a single cell.
+    CELL_SIZE = 0.05
+
+    def __init__(self, mountains, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.lon_cells = math.ceil(360.0 / cell_size)
+        self.size = 0
+        self._cells = defaultdict(list)
+
+        # Insertion order is preserved inside every cell, so candidates come back
+        # in the same order as the source iterable (important for first-match logic).
+        for mountain in mountains:
+            for cell in self._cells_for(mountain):
+                self._cells[cell].append(mountain)
+            self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def _row(self, lat):
+        return math.floor((lat + 90.0) / self.cell_size)
+
+    def _col(self, lon):
+        # Modulo wraps the antimeridian: 180° and -180° end up in the same column.
+        return math.floor((lon + 180.0) / self.cell_size) % self.lon_cells
+
+    def _cells_for(self, mountain):
+        """
+        Yields every (row, col) cell overlapped by the mountain's radius bounding box.
+        """
+        lat_min, lat_max, dlon = radius_bbox(mountain)
+        if dlon is None:
+            # Near the poles the circle can span every meridian.
+            cols = range(self.lon_cells)
+        else:
+            first = math.floor((mountain.longitude - dlon + 180.0) / self.cell_size)
+            last = math.floor((mountain.longitude + dlon + 180.0) / self.cell_size)
+            cols = sorted({c % self.lon_cells for c in range(first, last + 1)})
+
+        for row in range(self._row(lat_min), self._row(lat_max) + 1):
+            for col in cols:
+                yield row, col
+
+    def candidates(self, lat, lon):
+        """
+        Returns the mountains whose radius could contain the point (lat, lon).
+        This is a cheap superset; callers still run the exact distance check.
+        """
+        return self._cells.get((self._row(lat), self._col(lon)), ())
+
+    def candidate_pairs(self, latitudes, longitudes):
+        """
+        Vectorized candidates() for many points (numpy arrays of degrees), e.g. a GPS
+        track. Returns (candidates, point_index, candidate_index): the union of the
+        points' candidates, and two parallel arrays pairing every point with each
+        candidate of its cell (positions in that list), ordered by point. Each
+        distinct cell is looked up only once, and points far from every peak get
+        no pairs at all.
+        """
+        rows = np.floor((latitudes + 90.0) / self.cell_size).astype(np.int64)
+        cols = np.floor((longitudes + 180.0) / self.cell_size).astype(np.int64) % self.lon_cells
+        keys, inverse = np.unique(rows * self.lon_cells + cols, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        positions = {}
+        members, sizes = [], np.zeros(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys.tolist()):
+            cell = self._cells.get(divmod(key, self.lon_cells), ())
+            sizes[i] = len(cell)
+            members.extend(positions.setdefault(id(m), (len(positions), m))[0] for m in cell)
+        candidates = [m for _, m in positions.values()]
+        if not candidates:
+            empty = np.zeros(0, dtype=np.intp)
+            return candidates, empty, empty
+
+        # Every point repeats once per candidate of its cell; the rank of each pair
+        # inside its point's run picks the candidate from the cell's slice of members.
+        members = np.asarray(members, dtype=np.intp)
+        cell_start = np.cumsum(sizes) - sizes
+        per_point = sizes[inverse]
+        point_index = np.repeat(np.arange(len(inverse)), per_point)
+        run_start = np.cumsum(per_point) - per_point
+        rank = np.arange(len(point_index)) - np.repeat(run_start, per_point)
+        candidate_index = members[np.repeat(cell_start[inverse], per_point) + rank]
+        return candidates, point_index, candidate_index
+
+
+MountainArrays = namedtuple('MountainArrays', 'latitude longitude radius')
+
+
+def mountain_arrays(mountains):
+    """
+    Array-backed copy of a mountain sequence for vectorized distance math.
+    Coordinates are stored in radians; position i matches mountains[i].
+    """
+    mountains = list(mountains)
+    return MountainArrays(
+        latitude=np.radians(np.fromiter((m.latitude for m in mountains), dtype=np.float64, count=len(mountains))),
+        longitude=np.radians(np.fromiter((m.longitude for m in mountains), dtype=np.float64, count=len(mountains))),
+        radius=np.fromiter((m.radius for m in mountains), dtype=np.float64, count=len(mountains)),
+    )
+
+
+def haversine(lat, lon, latitudes, longitudes):
+    """
+    Great-circle distances in meters from one point (radians) to arrays of points (radians).
+    Broadcasts like numpy: a column of points against a row of peaks gives a matrix.
+    """
+    a = (np.sin((latitudes - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class NearestIndex:
+    """
+    k-nearest-peak lookups over the catalog, for explaining failed matches.
+
+    Peak centres are bucketed in a lat/lon grid sized for about PEAKS_PER_CELL
+    peaks per occupied cell. A lookup computes, in one vectorized pass, a lower
+    bound of the distance to every occupied cell, then visits the cells from the
+    closest bound on and stops as soon as the next bound exceeds the k-th best
+    distance found. The answer is exact; for a point among or near the peaks
+    only a handful of cells are opened.
+    """
+
+    PEAKS_PER_CELL = 64
+    # Cells smaller than ~1 km or larger than ~1100 km make no sense for peaks
+    MIN_CELL_SIZE = 0.01
+    MAX_CELL_SIZE = 10.0
+    # Cells whose bounds are sorted up front; the rest only if those don't settle it
+    FIRST_CELLS = 32
+
+    def __init__(self, mountains, arrays=None):
+        self.mountains = list(mountains)
+        self.arrays = arrays if arrays is not None else mountain_arrays(self.mountains)
+        if not self.mountains:
+            return
+
+        lat, lon = np.degrees(self.arrays.latitude), np.degrees(self.arrays.longitude)
+        area = max(np.ptp(lat), self.MIN_CELL_SIZE) * max(np.ptp(lon), self.MIN_CELL_SIZE)
+        self.cell_size = float(np.clip(math.sqrt(area * self.PEAKS_PER_CELL / len(self.mountains)),
+                                       self.MIN_CELL_SIZE, self.MAX_CELL_SIZE))
+        rows = np.floor((lat + 90.0) / self.cell_size).astype(np.int64)
+        cols = np.floor((lon + 180.0) / self.cell_size).astype(np.int64)
+
+        # Group peak positions by cell: sort by cell key, then split at key changes
+        keys = rows * (math.ceil(360.0 / self.cell_size) + 1) + cols
+        order = np.argsort(keys, kind='stable')
+        starts = np.flatnonzero(np.r_[True, keys[order][1:] != keys[order][:-1]])
+        self.cell_positions = np.split(order, starts[1:])
+        first = order[starts]
+
+        # Bounds of every occupied cell: latitudes in radians, longitudes in degrees
+        self.lat_lo = np.radians(rows[first] * self.cell_size - 90.0)
+        self.lat_hi = np.radians(np.minimum((rows[first] + 1) * self.cell_size - 90.0, 90.0))
+        self.lon_mid = (cols[first] + 0.5) * self.cell_size - 180.0
+        self.cos_far = np.cos(np.maximum(np.abs(self.lat_lo), np.abs(self.lat_hi)))
+
+    def __len__(self):
+        return len(self.mountains)
+
+    def cell_bounds(self, lat, lon):
+        """
+        Lower bound (meters) of the distance from (lat, lon) (radians, degrees) to
+        any point of each occupied cell. Haversine with the smallest possible
+        latitude and longitude differences, and the cosine of the cell's latitude
+        farthest from the equator.
+        """
+        dlat = np.maximum(0.0, np.maximum(self.lat_lo - lat, lat - self.lat_hi))
+        dlon = np.abs((lon - self.lon_mid + 180.0) % 360.0 - 180.0)
+        dlon = np.radians(np.maximum(0.0, dlon - self.cell_size / 2))
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat) * self.cos_far * np.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def nearest(self, lat, lon, k=3):
+        """
+        Returns [(mountain, meters), ...] for the k peaks closest to (lat, lon),
+        nearest first. Distances are haversine (within 0.6% of the geodesic).
+        """
+        if not self.mountains or k <= 0:
+            return []
+        k = min(k, len(self.mountains))
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+
+        bounds = self.cell_bounds(lat_r, lon)
+        if len(bounds) > self.FIRST_CELLS:
+            first = np.argpartition(bounds, self.FIRST_CELLS)[:self.FIRST_CELLS]
+            visit = first[np.argsort(bounds[first])]
+        else:
+            visit = np.argsort(bounds)
+
+        positions, distances = np.empty(0, dtype=np.intp), np.empty(0)
+        best = math.inf
+        for step in range(len(bounds)):
+            if step == len(visit):
+                # The nearest cells weren't enough: continue in full bound order
+                visit = np.argsort(bounds)
+            cell = visit[step]
+            if bounds[cell] > best:
+                break
+            new = self.cell_positions[cell]
+            positions = np.concatenate((positions, new))
+            distances = np.concatenate((distances, haversine(
+                lat_r, lon_r, self.arrays.latitude[new], self.arrays.longitude[new])))
+            if len(distances) >= k:
+                best = np.partition(distances, k - 1)[k - 1]
+
+        order = np.argsort(distances, kind='stable')[:k]
+        return [(self.mountains[positions[i]], float(distances[i])) for i in order]
@@ -0,0 +1,98 @@
+# mountains/storage.py
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+# peaks/ab/cd/<sha256>.<ext>: two levels of 256 directories keep every directory
+# small (a few hundred files even with tens of millions of photos)
+SHARDED_NAME = re.compile(r'^peaks/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+def file_sha256(file, chunk_size=64 * 1024):
+    """
+    SHA-256 of an uploaded or stored file, for uploads that bypassed
+    GpsPrecheckUploadHandler (which hashes the chunks while they stream in).
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(chunk_size):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def sharded_name(content_hash, filename):
+    """
+    Content-addressed storage name of a photo, keeping the original extension.
+    """
+    ext = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f"peaks/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{ext}"
+
+
+def photo_upload_to(instance, filename):
+    """
+    upload_to of Photo.image. The upload view has already hashed the file; other
+    callers (admin, scripts) get the hash computed and stored on the instance here.
+    """
+    if not instance.content_hash:
+        instance.content_hash = file_sha256(instance.image.file)
+    return sharded_name(instance.content_hash, filename)
+
+
+class ShardedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage with atomic writes: the file is written to a temporary
+    name in the target directory and renamed into place, so a crash or a
+    concurrent reader never sees a half-written file.
+
+    Content-addressed names are kept as they are. A file already stored under
+    such a name has the same bytes, so it's replaced instead of getting a
+    random suffix (which would defeat the addressing).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if SHARDED_NAME.match(name.replace('\\', '/')):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            # Same as FileSystemStorage: the mode must not be masked by the umask
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        # Same directory as the target, so the final rename never crosses filesystems
+        tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # Large uploads already sit in a temporary file: move it (a rename
+                # on the same filesystem) instead of copying the bytes
+                file_move_safe(content.temporary_file_path(), tmp_path)
+            else:
+                # Stream chunk by chunk; the whole file is never held in memory
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+                with os.fdopen(fd, 'wb') as out:
+                    for chunk in content.chunks():
+                        out.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+                    out.flush()
+                    os.fsync(out.fileno())
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Django stores names with forward slashes
+        return str(name).replace('\\', '/')
@@ -0,0 +1,590 @@
+# mountains/tests.py
+import asyncio
+import datetime
+import io
+import os
+import random
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from geopy.distance import geodesic
+from PIL import Image
+
+from .admin import IndexedDatesQuerySet
+from .benchmarking import phone_sized_jpeg
+from .catalog import get_catalog
+from .importers import IMPORTED, import_photo_archive
+from .leaderboard import scores_drift
+from .metrics import render_text
+from .spatial import MountainIndex
+from .models import Badge, Mountain, Photo, UserBadgeProgress
+from .progress import add_visit, badges_unlocked, rebuild_progress
+from .rematch import rematch_photos
+from .renditions import generate_renditions_job
+from .utils import HAVERSINE_MARGIN, check_proximity, check_proximity_batch, check_proximity_many, nearest_match
+from .verification import NO_GPS_MESSAGE, verify_photo_job
+from .views import profile_cache_key
+
+
+# Each test starts from an empty cache, so cached pages and catalog snapshots of
+# one test never leak into another
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def recorded_queries(view):
+    """
+    Sum of odznaki_request_db_queries for a view, as exported on /metrics.
+    """
+    match = re.search(rf'^odznaki_request_db_queries_sum{{view="{view}"}} (\S+)$', render_text(), re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        Mountain.objects.create(name='Rysy', altitude=2499, latitude=49.1795, longitude=20.0881)
+
+    def test_metrics_endpoint_access(self):
+        # Not even localhost by default: behind a local proxy every request comes from there
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    async def test_async_view_queries_are_counted(self):
+        await self.async_client.aforce_login(self.user)
+        before = recorded_queries('profile')
+        response = await self.async_client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(recorded_queries('profile'), before)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfileQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.mountains = Mountain.objects.bulk_create(
+            Mountain(name=f'Peak {i}', altitude=1000 + i, latitude=49 + i / 100, longitude=20)
+            for i in range(20)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_badge(self, name, mountains):
+        # The catalog version is bumped on commit (see mountains/signals.py)
+        with self.captureOnCommitCallbacks(execute=True):
+            badge = Badge.objects.create(name=name)
+            badge.mountains.set(mountains)
+        return badge
+
+    def expire_profile(self):
+        """
+        Warms the catalog and the session, then drops the cached page body, so the
+        next profile view runs all of its queries.
+        """
+        self.client.get(reverse('profile'))
+        cache.delete(profile_cache_key(self.user.id))
+
+    def test_query_count_does_not_grow_with_badges(self):
+        self.add_badge('Tatry', self.mountains[:3])
+        for mountain in self.mountains[:5]:
+            add_visit(self.user.id, mountain.id, timezone.now(), 1)
+        self.expire_profile()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('profile'))
+        # Kept as a number: the next request resets the captured query log
+        one_badge = len(queries)
+        self.assertGreater(one_badge, 0)
+
+        for i in range(50):
+            self.add_badge(f'Badge {i}', self.mountains[i % 10:i % 10 + 5])
+        self.expire_profile()
+        with self.assertNumQueries(one_badge):
+            response = self.client.get(reverse('profile'))
+        self.assertContains(response, 'Badge 49')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AdminQueryCountTests(TestCase):
+    """
+    The admin pages must not run a query per row (changelists) or per catalog
+    mountain (badge form), however large the tables grow.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='secret')
+        cls.mountains = Mountain.objects.bulk_create(
+            Mountain(name=f'Peak {i}', altitude=1000 + i, latitude=49 + i / 100, longitude=20)
+            for i in range(5)
+        )
+        cls.badge = Badge.objects.create(name='Tatry')
+        cls.badge.mountains.set(cls.mountains[:3])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_photos(self, count):
+        users = [User.objects.create_user(f'climber{User.objects.count()}') for _ in range(3)]
+        Photo.objects.bulk_create(
+            Photo(user=users[i % len(users)], image=f'photos/{i}.jpg', latitude=49, longitude=20,
+                  matched_mountain=self.mountains[i % len(self.mountains)],
+                  status=Photo.Status.VERIFIED if i % 2 else Photo.Status.REJECTED)
+            for i in range(count)
+        )
+
+    def queries(self, url):
+        self.client.get(url)  # warms the session
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url, grow):
+        before = self.queries(url)
+        grow()
+        with self.assertNumQueries(before):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_photo_changelist(self):
+        self.add_photos(3)
+        self.assert_constant_queries(reverse('admin:mountains_photo_changelist'), lambda: self.add_photos(60))
+
+    def test_filtered_photo_changelist(self):
+        self.add_photos(3)
+        url = reverse('admin:mountains_photo_changelist') + '?status__exact=verified'
+        self.assert_constant_queries(url, lambda: self.add_photos(60))
+
+    def test_badge_change_page(self):
+        def grow_catalog():
+            Mountain.objects.bulk_create(
+                Mountain(name=f'Hill {i}', altitude=500, latitude=50, longitude=19 + i / 100) for i in range(200)
+            )
+        url = reverse('admin:mountains_badge_change', args=[self.badge.id])
+        self.assert_constant_queries(url, grow_catalog)
+        # Only the selected mountains are rendered; the rest are searched on demand
+        response = self.client.get(url)
+        self.assertContains(response, 'Peak 0')
+        self.assertNotContains(response, 'Hill 0')
+
+
+class IndexedDatesQuerySetTests(TestCase):
+    def test_matches_distinct_datetimes(self):
+        user = User.objects.create_user('tester')
+        Photo.objects.bulk_create(Photo(user=user, image=f'photos/{i}.jpg', latitude=49, longitude=20) for i in range(40))
+        start = timezone.make_aware(datetime.datetime(2021, 12, 30, 22))
+        for i, photo_id in enumerate(Photo.objects.values_list('id', flat=True)):
+            Photo.objects.filter(id=photo_id).update(uploaded_at=start + datetime.timedelta(hours=7 * i * i))
+
+        photos = Photo.objects.all()
+        indexed = IndexedDatesQuerySet(Photo, photos.query)
+        for tz in ('UTC', 'Europe/Warsaw'):
+            with timezone.override(tz):
+                for kind, filters in (('year', {}), ('month', {'uploaded_at__year': 2022}),
+                                      ('day', {'uploaded_at__year': 2022, 'uploaded_at__month': 1})):
+                    for order in ('ASC', 'DESC'):
+                        self.assertEqual(
+                            list(indexed.filter(**filters).datetimes('uploaded_at', kind, order)),
+                            list(photos.filter(**filters).datetimes('uploaded_at', kind, order)),
+                        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PhotoEditProgressTests(TestCase):
+    """
+    Edits of a saved photo (admin, shell) keep the per-user tables in line with the photo history.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester')
+        cls.other = User.objects.create_user('other')
+        cls.rysy = Mountain.objects.create(name='Rysy', altitude=2499, latitude=49.1795, longitude=20.0881)
+        cls.giewont = Mountain.objects.create(name='Giewont', altitude=1894, latitude=49.2509, longitude=19.9339)
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            badge = Badge.objects.create(name='Tatry')
+            badge.mountains.set([self.rysy, self.giewont])
+        self.photos = [self.save_photo(mountain) for mountain in (self.rysy, self.giewont)]
+
+    def save_photo(self, mountain):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Photo.objects.create(user=self.user, image='photos/x.jpg', latitude=49, longitude=20,
+                                        matched_mountain=mountain, status=Photo.Status.VERIFIED)
+
+    def edit(self, photo, **fields):
+        for name, value in fields.items():
+            setattr(photo, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+
+    def assert_consistent(self):
+        call_command('rebuild_progress', check=True, stdout=io.StringIO())
+        self.assertEqual(scores_drift(), 0)
+
+    def test_created_verified_photos_are_counted(self):
+        self.assertTrue(UserBadgeProgress.objects.get(user=self.user).unlocked_at)
+        self.assert_consistent()
+
+    def test_rejecting_a_photo(self):
+        self.edit(self.photos[0], status=Photo.Status.REJECTED, matched_mountain=None)
+        self.assertIsNone(UserBadgeProgress.objects.get(user=self.user).unlocked_at)
+        self.assert_consistent()
+
+    def test_rematching_a_photo(self):
+        self.edit(self.photos[0], matched_mountain=self.giewont)
+        self.assert_consistent()
+        self.edit(self.photos[0], matched_mountain=self.rysy)
+        self.assert_consistent()
+
+    def test_moving_a_photo_to_another_user(self):
+        self.edit(self.photos[1], user=self.other)
+        self.assert_consistent()
+
+    def test_verifying_a_rejected_photo(self):
+        self.edit(self.photos[0], status=Photo.Status.REJECTED, matched_mountain=None)
+        self.edit(self.photos[0], status=Photo.Status.VERIFIED, matched_mountain=self.rysy)
+        self.assertTrue(UserBadgeProgress.objects.get(user=self.user).unlocked_at)
+        self.assert_consistent()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RebuildUnlockTests(TestCase):
+    """
+    Rebuilds keep existing unlocks as they were and announce the badges they unlock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester')
+        cls.rysy = Mountain.objects.create(name='Rysy', altitude=2499, latitude=49.1795, longitude=20.0881)
+
+    def setUp(self):
+        cache.clear()
+        self.announced = []
+        receiver = lambda user_id, badges, **kwargs: self.announced.append((user_id, [b.name for b in badges]))
+        badges_unlocked.connect(receiver, weak=False)
+        self.addCleanup(badges_unlocked.disconnect, receiver)
+
+    def add_photo(self, latitude, longitude, mountain=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Photo.objects.create(
+                user=self.user, image='photos/x.jpg', latitude=latitude, longitude=longitude, matched_mountain=mountain,
+                status=Photo.Status.VERIFIED if mountain else Photo.Status.REJECTED,
+            )
+
+    def add_badge(self, name, mountains):
+        with self.captureOnCommitCallbacks(execute=True):
+            badge = Badge.objects.create(name=name)
+            badge.mountains.set(mountains)
+        return badge
+
+    def test_rematch_announces_new_unlocks(self):
+        self.add_photo(self.rysy.latitude, self.rysy.longitude, self.rysy)
+        # Rejected while the catalog had no Giewont yet
+        self.add_photo(49.2509, 19.9339)
+        with self.captureOnCommitCallbacks(execute=True):
+            giewont = Mountain.objects.create(name='Giewont', altitude=1894, latitude=49.2509, longitude=19.9339)
+        self.add_badge('Tatry', [self.rysy, giewont])
+        self.assertEqual(self.announced, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rematch_photos(workers=1)
+        progress = UserBadgeProgress.objects.get(user=self.user)
+        self.assertIsNotNone(progress.unlocked_at)
+        self.assertFalse(progress.unlock_seen)
+        self.assertEqual(self.announced, [(self.user.id, ['Tatry'])])
+
+        # Once seen, a later rebuild neither re-announces nor moves the unlock
+        UserBadgeProgress.objects.update(unlock_seen=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_progress([self.user.id])
+        rebuilt = UserBadgeProgress.objects.get(user=self.user)
+        self.assertEqual((rebuilt.unlocked_at, rebuilt.unlock_seen), (progress.unlocked_at, True))
+        self.assertEqual(len(self.announced), 1)
+
+    def test_badge_change_announces_new_unlocks(self):
+        self.add_photo(self.rysy.latitude, self.rysy.longitude, self.rysy)
+        self.add_badge('Rysy', [self.rysy])
+        self.assertFalse(UserBadgeProgress.objects.get(user=self.user).unlock_seen)
+        self.assertEqual(self.announced, [(self.user.id, ['Rysy'])])
+
+    def test_archive_import_announces_new_unlocks(self):
+        self.add_photo(self.rysy.latitude, self.rysy.longitude, self.rysy)
+        with self.captureOnCommitCallbacks(execute=True):
+            giewont = Mountain.objects.create(name='Giewont', altitude=1894, latitude=49.2509, longitude=19.9339)
+        self.add_badge('Tatry', [self.rysy, giewont])
+
+        with tempfile.TemporaryDirectory() as media, tempfile.TemporaryDirectory() as archive:
+            Path(archive, 'giewont.jpg').write_bytes(phone_sized_jpeg(64, 48, giewont.latitude, giewont.longitude))
+            with override_settings(MEDIA_ROOT=media), self.captureOnCommitCallbacks(execute=True):
+                stats = import_photo_archive(archive, self.user, workers=1)
+        self.assertEqual(stats[IMPORTED], 1)
+        self.assertFalse(UserBadgeProgress.objects.get(user=self.user).unlock_seen)
+        self.assertEqual(self.announced, [(self.user.id, ['Tatry'])])
+
+
+def jpeg_without_gps(width=1600, height=1200):
+    out = io.BytesIO()
+    Image.frombytes('RGB', (width, height), os.urandom(width * height * 3)).save(out, format='JPEG', quality=95)
+    return out.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UploadPrecheckTests(TestCase):
+    """
+    A photo without GPS is rejected from its header: the rest of it never reaches the
+    file upload handlers (no Pillow, hashing or storage). Under WSGI the body is
+    streamed, so nothing is buffered at all; under ASGI Django spools the whole body
+    before any view runs (see the README), which these tests measure.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester')
+        cls.photo = jpeg_without_gps()
+        cls.body = encode_multipart(BOUNDARY, {'image': SimpleUploadedFile('nogps.jpg', cls.photo, 'image/jpeg')})
+
+    def counting(self):
+        """
+        Patches the file upload handlers and the spooled temporary file; returns
+        a function giving (bytes passed to the handlers, bytes spooled).
+        """
+        patches = [mock.patch.object(cls, 'receive_data_chunk', autospec=True, side_effect=cls.receive_data_chunk)
+                   for cls in (MemoryFileUploadHandler, TemporaryFileUploadHandler)]
+        patches.append(mock.patch.object(tempfile.SpooledTemporaryFile, 'write', autospec=True,
+                                         side_effect=tempfile.SpooledTemporaryFile.write))
+        mocks = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+        return lambda: tuple(sum(len(call.args[1]) for m in group for call in m.call_args_list)
+                             for group in (mocks[:2], mocks[2:]))
+
+    def test_wsgi_rejects_without_buffering(self):
+        self.client.force_login(self.user)
+        counted = self.counting()
+        response = self.client.post(reverse('upload'), {'image': SimpleUploadedFile('nogps.jpg', self.photo, 'image/jpeg')})
+        self.assertFormError(response.context['form'], 'image', NO_GPS_MESSAGE)
+        self.assertEqual(counted(), (0, 0))
+        self.assertFalse(Photo.objects.exists())
+
+    async def test_asgi_rejects_after_spooling(self):
+        await self.async_client.aforce_login(self.user)
+        token = 'a' * 32
+        headers = [
+            (b'content-type', MULTIPART_CONTENT.encode()), (b'content-length', str(len(self.body)).encode()),
+            (b'cookie', f"sessionid={self.async_client.cookies['sessionid'].value}; csrftoken={token}".encode()),
+            (b'x-csrftoken', token.encode()), (b'host', b'testserver'),
+        ]
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+                 'scheme': 'http', 'path': reverse('upload'), 'raw_path': reverse('upload').encode(),
+                 'query_string': b'', 'headers': headers, 'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+                 'root_path': ''}
+        # The body arrives in 64 KiB messages, as an ASGI server sends it
+        chunks = [self.body[i:i + 65536] for i in range(0, len(self.body), 65536)]
+        sent = []
+
+        async def receive():
+            if not chunks:
+                # Like a server waiting for the client to disconnect
+                await asyncio.Event().wait()
+            chunk = chunks.pop(0)
+            return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+        async def send(message):
+            sent.append(message)
+
+        counted = self.counting()
+        await get_asgi_application()(scope, receive, send)
+        self.assertEqual(sent[0]['status'], 200)
+        # The re-rendered form marks the rejected photo field
+        self.assertIn(b'aria-invalid="true"', b''.join(m.get('body', b'') for m in sent))
+        self.assertEqual(counted(), (0, len(self.body)))
+        self.assertFalse(await Photo.objects.aexists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RejectedDuplicateTests(TestCase):
+    """
+    A photo rejected while its mountain was missing from the catalog is verified
+    again when the user re-uploads or re-imports the same file.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester')
+        cls.photo = phone_sized_jpeg(64, 48, 49.2509, 19.9339)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(self.user)
+
+    def upload(self, before_verification=None):
+        self.client.post(reverse('upload'), {'image': SimpleUploadedFile('giewont.jpg', self.photo, 'image/jpeg')})
+        photo = Photo.objects.filter(user=self.user).latest('id')
+        if before_verification:
+            before_verification()
+        with self.captureOnCommitCallbacks(execute=True):
+            verify_photo_job(photo.id)
+        photo.refresh_from_db()
+        return photo
+
+    def add_giewont(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            giewont = Mountain.objects.create(name='Giewont', altitude=1894, latitude=49.2509, longitude=19.9339)
+        # Loaded here: the upload's pre-check runs in the image pool, whose database
+        # connection can't read tables this test's transaction has written
+        get_catalog()
+        return giewont
+
+    def upload_rejected(self):
+        """
+        Uploads the photo, then removes its mountain before the verification job runs.
+        """
+        giewont = self.add_giewont()
+
+        def remove_giewont():
+            with self.captureOnCommitCallbacks(execute=True):
+                giewont.delete()
+
+        rejected = self.upload(remove_giewont)
+        self.assertEqual(rejected.status, Photo.Status.REJECTED)
+        return rejected
+
+    def test_reupload_of_rejected_photo_is_verified(self):
+        rejected = self.upload_rejected()
+        giewont = self.add_giewont()
+
+        photo = self.upload()
+        self.assertNotEqual(photo.id, rejected.id)
+        self.assertEqual((photo.status, photo.matched_mountain), (Photo.Status.VERIFIED, giewont))
+        # The same file is stored once
+        self.assertEqual(photo.image.name, rejected.image.name)
+        # Uploading it yet again is a duplicate of the verified copy
+        self.client.post(reverse('upload'), {'image': SimpleUploadedFile('giewont.jpg', self.photo, 'image/jpeg')})
+        self.assertEqual(Photo.objects.filter(user=self.user).count(), 2)
+
+    def test_reimport_of_rejected_photo_is_imported(self):
+        rejected = self.upload_rejected()
+        self.add_giewont()
+        with tempfile.TemporaryDirectory() as archive:
+            Path(archive, 'giewont.jpg').write_bytes(self.photo)
+            stats = import_photo_archive(archive, self.user, workers=1)
+        self.assertEqual(stats[IMPORTED], 1)
+        imported = Photo.objects.exclude(id=rejected.id).get(user=self.user)
+        self.assertEqual((imported.status, imported.image.name), (Photo.Status.VERIFIED, rejected.image.name))
+
+
+try:
+    import pillow_heif
+except ImportError:
+    pillow_heif = None
+
+
+@unittest.skipIf(pillow_heif is None, "pillow-heif is not installed")
+@override_settings(CACHES=TEST_CACHES)
+class HeicUploadTests(TestCase):
+    """
+    HEIC keeps its EXIF after the pixel data, so the pre-check lets it through; the
+    form's ImageField and the renditions then need the HEIF opener to read it.
+    """
+
+    def test_heic_upload_is_verified(self):
+        user = User.objects.create_user('tester')
+        rysy = Mountain.objects.create(name='Rysy', altitude=2499, latitude=49.1795, longitude=20.0881)
+        # Re-encodes the JPEG fixture as HEIC, keeping its GPS EXIF
+        jpeg = Image.open(io.BytesIO(phone_sized_jpeg(64, 48, rysy.latitude, rysy.longitude)))
+        heic = io.BytesIO()
+        pillow_heif.from_pillow(jpeg).save(heic, exif=jpeg.info['exif'])
+
+        self.client.force_login(user)
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            self.client.post(reverse('upload'), {'image': SimpleUploadedFile('IMG_0001.heic', heic.getvalue(), 'image/heic')})
+            photo = Photo.objects.get(user=user)
+            with self.captureOnCommitCallbacks(execute=True):
+                verify_photo_job(photo.id)
+            generate_renditions_job(photo.id)
+            photo.refresh_from_db()
+        self.assertEqual((photo.status, photo.matched_mountain), (Photo.Status.VERIFIED, rysy))
+        self.assertTrue(photo.thumbnail and photo.preview)
+
+
+class ProximityEquivalenceTests(SimpleTestCase):
+    """
+    The indexed and vectorized matchers must return exactly what the geodesic check
+    over the whole catalog (nearest_match) returns, including right at the radius,
+    around the poles and across the antimeridian.
+    """
+
+    # Distances from a peak as fractions of its radius: well inside, inside and
+    # outside the haversine band, and just outside the circle
+    FRACTIONS = (0.5, 1 - 2 * HAVERSINE_MARGIN, 0.995, 0.9995, 1.0005, 1.005, 1 + 2 * HAVERSINE_MARGIN)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(7)
+        centres = [
+            (49.1795, 20.0881), (49.2509, 19.9339),  # Tatra
+            (89.9995, 0.0), (89.998, 135.0), (-89.999, -60.0),  # circles reaching around a pole
+            (0.0, 179.999), (12.5, -179.9985), (-33.0, 180.0), (65.0, -180.0),  # antimeridian
+        ]
+        # Clusters of peaks whose circles overlap, so several candidates compete
+        for lat, lon in list(centres):
+            centres += [(lat + rng.uniform(-0.004, 0.004), ((lon + rng.uniform(-0.004, 0.004) + 180) % 360) - 180)
+                        for _ in range(3) if abs(lat) < 89.9]
+        cls.mountains = [
+            SimpleNamespace(id=i, latitude=max(min(lat, 90.0), -90.0), longitude=lon, radius=rng.choice((100, 200, 500)))
+            for i, (lat, lon) in enumerate(centres)
+        ]
+
+        points = [(90.0, 0.0), (90.0, -123.0), (-90.0, 45.0), (0.0, 180.0), (0.0, -180.0), (45.0, 90.0)]
+        for m in cls.mountains:
+            for fraction in cls.FRACTIONS:
+                for bearing in (0, 90, rng.uniform(0, 360)):
+                    p = geodesic(meters=m.radius * fraction).destination((m.latitude, m.longitude), bearing)
+                    points.append((p.latitude, p.longitude))
+        cls.points = points
+        cls.expected = [nearest_match(point, cls.mountains) for point in points]
+
+    def test_fixture_covers_matches_and_misses(self):
+        self.assertGreater(sum(m is not None for m in self.expected), 50)
+        self.assertGreater(sum(m is None for m in self.expected), 50)
+
+    def test_indexed_lookup(self):
+        index = MountainIndex(self.mountains)
+        self.assertEqual([check_proximity(lat, lon, index) for lat, lon in self.points], self.expected)
+
+    def test_batch(self):
+        self.assertEqual(check_proximity_batch(self.points, self.mountains), self.expected)
+
+    def test_many(self):
+        self.assertEqual(check_proximity_many(self.points, MountainIndex(self.mountains)), self.expected)
@@ -0,0 +1,267 @@
+# mountains/tracks.py
+import struct
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import transaction
+
+from .catalog import get_catalog
+from .metrics import stage
+from .models import Track, TrackVisit
+from .progress import bump_progress_version, record_track_visits
+from .utils import mountains_entered
+
+# Upload limits: a day of 1 s recording is ~90k points, a few MB of GPX
+MAX_TRACK_SIZE = 50 * 2**20
+MAX_TRACK_POINTS = 1_000_000
+
+# Rejection messages (form errors and Track.rejection_reason)
+UNSUPPORTED_TRACK_MESSAGE = "Unsupported file. Please upload a GPX or FIT track."
+TRACK_TOO_LARGE_MESSAGE = "The track file is too large (max {max_mb} MB)."
+UNREADABLE_TRACK_MESSAGE = "The track file could not be read: {error}"
+EMPTY_TRACK_MESSAGE = "The track contains no GPS points."
+NO_SUMMIT_MESSAGE = "The track doesn't pass within the radius of any mountain in our database."
+
+# FIT stores times as seconds since 1989-12-31 00:00 UTC and positions in semicircles
+FIT_EPOCH = 631065600
+SEMICIRCLES_TO_DEGREES = 180.0 / 2**31
+FIT_RECORD_MESSAGE = 20
+FIT_INVALID_POSITION = 0x7FFFFFFF
+
+
+class TrackError(ValueError):
+    """
+    The track file can't be used; the message is shown to the user.
+    """
+
+
+def track_format(file):
+    """
+    'gpx' or 'fit' judging by the first bytes of the file, else None.
+    """
+    file.seek(0)
+    head = file.read(1024)
+    file.seek(0)
+    if len(head) >= 12 and head[8:12] == b'.FIT':
+        return 'fit'
+    if b'<gpx' in head:
+        return 'gpx'
+    return None
+
+
+def parse_gpx_time(text):
+    # fromisoformat() accepts the trailing Z since Python 3.11
+    moment = datetime.fromisoformat(text.strip())
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment.timestamp()
+
+
+def iter_gpx_points(file):
+    """
+    Yields (latitude, longitude, unix time or NaN) for every <trkpt> of a GPX file.
+    iterparse streams the document and finished points are dropped, so memory
+    stays flat however long the track is. Planned routes and waypoints are
+    ignored: only recorded points prove a visit.
+    """
+    segment = None
+    for event, element in ET.iterparse(file, events=('start', 'end')):
+        tag = element.tag.rpartition('}')[2]
+        if event == 'start':
+            if tag == 'trkseg':
+                segment = element
+            continue
+        if tag != 'trkpt':
+            continue
+
+        try:
+            lat, lon = float(element.get('lat')), float(element.get('lon'))
+        except (TypeError, ValueError):
+            raise TrackError(f"invalid trkpt coordinates {element.get('lat')!r}, {element.get('lon')!r}")
+        moment = float('nan')
+        for child in element:
+            if child.tag.rpartition('}')[2] == 'time':
+                try:
+                    moment = parse_gpx_time(child.text or '')
+                except ValueError:
+                    pass
+                break
+        yield lat, lon, moment
+        if segment is not None:
+            segment.clear()
+
+
+def read_exact(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise TrackError("unexpected end of FIT file")
+    return data
+
+
+def iter_fit_points(file):
+    """
+    Yields (latitude, longitude, unix time or NaN) for every record message of a
+    FIT activity file that carries a position. Only the parts of the format needed
+    for that are decoded; other messages are skipped by their definitions.
+    """
+    header_size = read_exact(file, 1)[0]
+    header = read_exact(file, header_size - 1)
+    data_size = struct.unpack_from('<I', header, 3)[0]
+
+    definitions = {}
+    last_timestamp = None
+    read = 0
+    while read < data_size:
+        record_header = read_exact(file, 1)[0]
+        read += 1
+        if record_header & 0x80:
+            # Compressed timestamp header: 5-bit offset from the last full timestamp
+            local = (record_header >> 5) & 0x03
+            offset = record_header & 0x1F
+            if last_timestamp is not None:
+                timestamp = (last_timestamp & ~0x1F) + offset
+                if offset < last_timestamp & 0x1F:
+                    timestamp += 0x20
+                last_timestamp = timestamp
+            is_definition, has_developer_data = False, False
+        else:
+            local = record_header & 0x0F
+            is_definition = bool(record_header & 0x40)
+            has_developer_data = bool(record_header & 0x20)
+
+        if is_definition:
+            fixed = read_exact(file, 5)
+            endian = '>' if fixed[1] else '<'
+            global_number = struct.unpack(endian + 'H', fixed[2:4])[0]
+            field_data = read_exact(file, 3 * fixed[4])
+            read += 5 + len(field_data)
+            fields = [tuple(field_data[i:i + 3]) for i in range(0, len(field_data), 3)]
+            developer_size = 0
+            if has_developer_data:
+                count = read_exact(file, 1)[0]
+                developer_data = read_exact(file, 3 * count)
+                read += 1 + len(developer_data)
+                developer_size = sum(developer_data[i + 1] for i in range(0, len(developer_data), 3))
+
+            # One struct per definition unpacks the wanted fields and skips the rest
+            layout, wanted = endian, []
+            for number, size, _ in fields:
+                if number in (0, 1) and size == 4 and global_number == FIT_RECORD_MESSAGE:
+                    layout += 'i'
+                    wanted.append(number)
+                elif number == 253 and size == 4:
+                    layout += 'I'
+                    wanted.append(number)
+                else:
+                    layout += f'{size}x'
+            layout += f'{developer_size}x'
+            definitions[local] = (global_number, struct.Struct(layout), wanted)
+            continue
+
+        if local not in definitions:
+            raise TrackError(f"data message for undefined local type {local}")
+        global_number, layout, wanted = definitions[local]
+        values = dict(zip(wanted, layout.unpack(read_exact(file, layout.size))))
+        read += layout.size
+        if 253 in values:
+            last_timestamp = values[253]
+        if global_number != FIT_RECORD_MESSAGE:
+            continue
+        lat, lon = values.get(0, FIT_INVALID_POSITION), values.get(1, FIT_INVALID_POSITION)
+        if lat == FIT_INVALID_POSITION or lon == FIT_INVALID_POSITION:
+            continue
+        moment = float('nan') if last_timestamp is None else float(last_timestamp + FIT_EPOCH)
+        yield lat * SEMICIRCLES_TO_DEGREES, lon * SEMICIRCLES_TO_DEGREES, moment
+
+
+def read_track(file):
+    """
+    Reads all points of a GPX or FIT track into compact arrays:
+    (latitudes, longitudes, unix times with NaN where unknown).
+    """
+    kind = track_format(file)
+    if kind is None:
+        raise TrackError(UNSUPPORTED_TRACK_MESSAGE)
+    points = iter_fit_points(file) if kind == 'fit' else iter_gpx_points(file)
+
+    latitudes, longitudes, times = array('d'), array('d'), array('d')
+    try:
+        for lat, lon, moment in points:
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                continue
+            latitudes.append(lat)
+            longitudes.append(lon)
+            times.append(moment)
+            if len(latitudes) > MAX_TRACK_POINTS:
+                raise TrackError(f"more than {MAX_TRACK_POINTS} points")
+    except (TrackError, ET.ParseError, struct.error) as e:
+        raise TrackError(UNREADABLE_TRACK_MESSAGE.format(error=e)) from e
+    return (np.frombuffer(latitudes, dtype=np.float64), np.frombuffer(longitudes, dtype=np.float64),
+            np.frombuffer(times, dtype=np.float64))
+
+
+def match_track(latitudes, longitudes, catalog):
+    """
+    Returns [(mountain record, index of the first point inside its radius), ...]
+    in track order. The grid index pairs every point with the few peaks of its
+    cell, then all pairs are measured in one vectorized pass instead of running
+    check_proximity() point by point.
+    """
+    candidates, point_index, mountain_index = catalog.index.candidate_pairs(latitudes, longitudes)
+    points = np.column_stack((latitudes, longitudes))
+    entered = mountains_entered(points, candidates, point_index, mountain_index)
+    return sorted(((candidates[j], i) for j, i in entered.items()), key=lambda pair: pair[1])
+
+
+def reject(track, message):
+    Track.objects.filter(id=track.id, status=Track.Status.PENDING).update(
+        status=Track.Status.REJECTED, rejection_reason=message[:255],
+    )
+    transaction.on_commit(lambda: bump_progress_version(track.user_id))
+
+
+def process_track_job(track_id):
+    """
+    Background job (see mountains/jobs.py) run for every uploaded track: reads its
+    points, finds every mountain whose radius it entered and records the visits.
+    Returns the badges (catalog BadgeRecords) the track has unlocked, if any.
+    """
+    track = Track.objects.filter(id=track_id, status=Track.Status.PENDING).first()
+    if track is None:
+        # Deleted in the meantime, or already processed by an earlier attempt
+        return []
+
+    try:
+        with stage('track.parse'), track.file.open('rb') as f:
+            latitudes, longitudes, times = read_track(f)
+    except TrackError as e:
+        reject(track, str(e))
+        return []
+    if not len(latitudes):
+        reject(track, EMPTY_TRACK_MESSAGE)
+        return []
+
+    with stage('track.match'):
+        entered = match_track(latitudes, longitudes, get_catalog())
+    if not entered:
+        reject(track, NO_SUMMIT_MESSAGE)
+        return []
+
+    visits = []
+    for mountain, index in entered:
+        moment = times[index]
+        visited_at = track.uploaded_at if np.isnan(moment) else datetime.fromtimestamp(moment, dt_timezone.utc)
+        visits.append(TrackVisit(track=track, mountain_id=mountain.id, visited_at=visited_at))
+
+    # Same guard as the photo verification job: only one run counts the track
+    with transaction.atomic():
+        updated = Track.objects.filter(id=track.id, status=Track.Status.PENDING).update(
+            status=Track.Status.PROCESSED, point_count=len(latitudes),
+        )
+        if not updated:
+            return []
+        TrackVisit.objects.bulk_create(visits)
+        transaction.on_commit(lambda: bump_progress_version(track.user_id))
+        return record_track_visits(track, visits)
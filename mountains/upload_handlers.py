@@ -0,0 +1,105 @@
+# mountains/upload_handlers.py
+import hashlib
+from io import BytesIO
+
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+from .exif import MAX_HEAD_SIZE, ExifAt, Truncated, find_tiff, parse_tiff_gps, sniff_format
+from .metrics import add_bytes_read, stage
+from .utils import gps_info_to_decimal
+from .verification import match_photo
+
+
+class GpsPrecheckUploadHandler(FileUploadHandler):
+    """
+    Validates the photo from its first chunks, while the request body is still streaming in.
+    (Under WSGI. Under ASGI Django has spooled the whole body before any handler runs,
+    so a rejected photo is still received in full; see the README.)
+
+    The chunks are held back (not passed to the memory/temporary-file handlers) until
+    the EXIF header has been parsed and matched against the catalog:
+    - no GPS or no matching mountain: the file is skipped, the rest of the body is
+      discarded without being spooled, and the reason is stored on
+      `request.upload_rejection` for PhotoUploadForm to report;
+    - otherwise (or when the header can't be judged from the head alone) the held
+      bytes are released to the next handler and the upload continues as usual.
+      The stored photo is then verified for good by verification.verify_photo_job.
+
+    Every chunk of the photo also feeds a SHA-256, stored on `request.upload_sha256`
+    when the file is complete, so duplicates are found without reading the file again.
+    """
+
+    # Only the photo field of PhotoUploadForm is pre-checked
+    field_name_to_check = 'image'
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.head = bytearray()
+        self.decided = field_name != self.field_name_to_check
+        self.sha256 = hashlib.sha256() if field_name == self.field_name_to_check else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sha256 is not None:
+            self.sha256.update(raw_data)
+            add_bytes_read(len(raw_data))
+        if self.decided:
+            return raw_data
+
+        self.head += raw_data
+        if len(self.head) >= 12 and sniff_format(self.head) is None:
+            # Not an image format we can read; the form reports the proper error
+            return self.release()
+        try:
+            with stage('upload.exif'):
+                tiff = find_tiff(self.head)
+                gps_info = parse_tiff_gps(tiff) if tiff is not None else None
+        except Truncated:
+            if len(self.head) < MAX_HEAD_SIZE:
+                # Keep holding until the EXIF block is complete
+                return None
+            return self.release()
+        except ExifAt:
+            # HEIF keeps EXIF after the pixel data; let the form check the full file
+            return self.release()
+
+        rejection = self.precheck(gps_info)
+        if rejection:
+            self.request.upload_rejection = rejection
+            raise SkipFile()
+        return self.release()
+
+    def precheck(self, gps_info):
+        """
+        Returns the validation message for a photo that can't be accepted, else None.
+        Uses the same rules as the background verification job.
+        """
+        with stage('upload.match'):
+            _, rejection = match_photo(*gps_info_to_decimal(gps_info))
+        return rejection
+
+    def release(self):
+        """
+        Stops checking and hands every held byte to the next handler in one chunk.
+        """
+        self.decided = True
+        data, self.head = bytes(self.head), None
+        return data
+
+    def file_complete(self, file_size):
+        if self.sha256 is not None:
+            self.request.upload_sha256 = self.sha256.hexdigest()
+        if self.decided:
+            # The next handler received the data and builds the uploaded file
+            return None
+        # The whole file fit in the held head without a verdict (e.g. no EXIF segment
+        # before a tiny image); hand it to the form as an in-memory file.
+        return InMemoryUploadedFile(
+            file=BytesIO(self.head),
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
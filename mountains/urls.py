@@ -7,4 +7,15 @@ urlpatterns = [
     path('', views.profile, name='profile'),
     # The form page to upload a new summit photo
     path('upload/', views.upload_photo, name='upload'),
+    # GPS track upload (GPX/FIT): credits every summit passed along the route
+    path('upload/track/', views.upload_track, name='upload_track'),
+    # Global and per-badge rankings
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    # Further pages of the profile photo history, loaded while scrolling
+    path('photos/', views.photo_history, name='photo_history'),
+    # Map markers (GeoJSON with ETag revalidation)
+    path('map/visited.geojson', views.visited_peaks_geojson, name='visited_peaks_geojson'),
+    path('map/peaks.geojson', views.catalog_peaks_geojson, name='catalog_peaks_geojson'),
+    # Prometheus metrics of this process
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,7 +1,16 @@
 # mountains/utils.py
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+from types import SimpleNamespace
+
+import numpy as np
 from geopy.distance import geodesic
+from .exif import read_gps_info
+from .spatial import EARTH_RADIUS, MountainIndex, haversine, mountain_arrays
+
+# Haversine on a sphere differs from the WGS84 geodesic by less than 0.6%,
+# so a 1% band around each radius separates certain results from borderline ones.
+HAVERSINE_MARGIN = 0.01
+# Upper bound on (photos x mountains) cells held in memory at once by the batch matcher.
+BATCH_MATRIX_CELLS = 1_000_000
 
 def get_decimal_from_dms(dms, ref):
     """
@@ -17,53 +26,217 @@ def get_decimal_from_dms(dms, ref):
         decimal = -decimal
     return decimal
 
+def gps_info_to_decimal(gps_info):
+    """
+    Converts decoded GPS tags into (latitude, longitude), or (None, None) if incomplete.
+    """
+    required = ('GPSLatitude', 'GPSLatitudeRef', 'GPSLongitude', 'GPSLongitudeRef')
+    if not gps_info or not all(key in gps_info for key in required):
+        return None, None
+
+    # Convert DMS components to decimal coordinates
+    lat = get_decimal_from_dms(gps_info['GPSLatitude'], gps_info['GPSLatitudeRef'])
+    lon = get_decimal_from_dms(gps_info['GPSLongitude'], gps_info['GPSLongitudeRef'])
+    return lat, lon
+
 def get_exif_data(image_file):
     """
-    Extracts GPS coordinates from an image file object using a functional approach.
+    Extracts GPS coordinates from an image file object.
+    Only the metadata header is parsed (see mountains/exif.py); pixel data is never decoded.
     Returns: (latitude, longitude) or (None, None)
     """
     try:
-        # Reset file pointer to beginning to ensure we read the whole file
-        image_file.seek(0)
-        img = Image.open(image_file)
-        
-        # extracting raw EXIF data
-        exif_data = img._getexif()
-        
-        if not exif_data:
-            return None, None
-
-        # Functional extraction of the specific "GPSInfo" tag.
-        # We iterate over the dictionary to find the key corresponding to "GPSInfo".
-        gps_raw = next((v for k, v in exif_data.items() if TAGS.get(k) == "GPSInfo"), None)
-
-        if not gps_raw:
-            return None, None
-
-        # Decode GPS specific tags (e.g., converting tag IDs to names like 'GPSLatitude')
-        gps_info = {GPSTAGS.get(k, k): v for k, v in gps_raw.items()}
-
-        # Convert DMS components to decimal coordinates
-        lat = get_decimal_from_dms(gps_info['GPSLatitude'], gps_info['GPSLatitudeRef'])
-        lon = get_decimal_from_dms(gps_info['GPSLongitude'], gps_info['GPSLongitudeRef'])
-        
-        return lat, lon
-        
+        return gps_info_to_decimal(read_gps_info(image_file))
     except Exception as e:
         print(f"EXIF Error: {e}")
         return None, None
+    finally:
+        # Leave the file ready to be saved from the beginning
+        image_file.seek(0)
 
-def check_proximity(photo_lat, photo_lon, mountains_queryset):
+def nearest_match(photo_coords, candidates):
+    """
+    Runs the exact geodesic check on `candidates` and returns the nearest mountain
+    whose radius contains the photo, or None.
+    On equal distances the candidate that comes first (catalog order) wins.
+    """
+    distances = ((geodesic((m.latitude, m.longitude), photo_coords).meters, m) for m in candidates)
+    return min(
+        ((distance, m) for distance, m in distances if distance <= m.radius),
+        key=lambda pair: pair[0],
+        default=(None, None)
+    )[1]
+
+def check_proximity(photo_lat, photo_lon, mountains):
     """
     Determines if the photo coordinates are within the radius of any known mountain.
-    Returns the first matching Mountain object or None.
+    `mountains` is either a prebuilt MountainIndex or any iterable of mountains
+    (e.g. a queryset), which is indexed on the fly.
+    Returns the nearest matching mountain (model instance or catalog record) or None.
+    """
+    if not isinstance(mountains, MountainIndex):
+        mountains = MountainIndex(mountains)
+
+    # The index narrows the catalog down to the few peaks whose radius could reach
+    # the photo, so the expensive geodesic() only runs on those candidates.
+    return nearest_match((photo_lat, photo_lon), mountains.candidates(photo_lat, photo_lon))
+
+def nearest_mountains(photo_lat, photo_lon, index, k):
+    """
+    The k mountains closest to the photo, whether or not their radius contains it,
+    as [(mountain, meters), ...] nearest first. `index` is a NearestIndex.
     """
-    photo_coords = (photo_lat, photo_lon)
+    found = []
+    for m, distance in index.nearest(photo_lat, photo_lon, k):
+        # Haversine is close enough to show, except right at the radius, where it
+        # could contradict the geodesic verdict (e.g. "199 m, radius 200 m")
+        if abs(distance - m.radius) <= m.radius * HAVERSINE_MARGIN:
+            distance = geodesic((m.latitude, m.longitude), (photo_lat, photo_lon)).meters
+        found.append((m, distance))
+    return sorted(found, key=lambda pair: pair[1])
+
+def check_proximity_batch(points, mountains, arrays=None):
+    """
+    Batch version of check_proximity for many photos at once (re-matching, imports).
+    `points` is a sequence of (latitude, longitude) pairs, `mountains` a sequence of
+    mountains and `arrays` their optional precomputed mountain_arrays() (Catalog.arrays).
+    Returns a list with the matching mountain or None for every point,
+    identical to calling check_proximity() on each point.
+    """
+    mountains = list(mountains)
+    if arrays is None:
+        arrays = mountain_arrays(mountains)
+    if not points or not mountains:
+        return [None] * len(points)
+
+    coords = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    outer_radius = arrays.radius * (1 + HAVERSINE_MARGIN)
+    inner_radius = arrays.radius * (1 - HAVERSINE_MARGIN)
+    cos_mountain_lat = np.cos(arrays.latitude)
+
+    # Photos are processed in chunks so the distance matrix stays within a fixed memory budget.
+    chunk_size = max(1, BATCH_MATRIX_CELLS // len(mountains))
+    results = []
+    for start in range(0, len(coords), chunk_size):
+        chunk = coords[start:start + chunk_size]
+        photo_lat = chunk[:, 0:1]
+        photo_lon = chunk[:, 1:2]
 
-    # Uses a generator expression with next() for efficiency.
-    # This stops iteration as soon as the first match is found (functional equivalent of a loop break).
-    return next(
-        (m for m in mountains_queryset 
-         if geodesic((m.latitude, m.longitude), photo_coords).meters <= m.radius), 
-        None
-    )
\ No newline at end of file
+        # Haversine distance matrix: rows are photos, columns are mountains.
+        a = (np.sin((arrays.latitude - photo_lat) / 2) ** 2
+             + np.cos(photo_lat) * cos_mountain_lat * np.sin((arrays.longitude - photo_lon) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+        for row, candidate_cols in enumerate(distance <= outer_radius):
+            cols = np.flatnonzero(candidate_cols)
+            if len(cols) == 0:
+                results.append(None)
+            elif len(cols) == 1 and distance[row, cols[0]] <= inner_radius[cols[0]]:
+                # A single candidate well inside its radius is a certain (and the only) match.
+                results.append(mountains[cols[0]])
+            else:
+                # Borderline or competing candidates are confirmed with geodesic().
+                # cols are ascending, so the tie rule matches the scalar path.
+                photo_coords = tuple(points[start + row])
+                results.append(nearest_match(photo_coords, (mountains[c] for c in cols)))
+    return results
+
+def check_proximity_many(points, index):
+    """
+    check_proximity() for many points at once against a prebuilt MountainIndex
+    (imports of whole photo archives). `points` is a sequence of (latitude, longitude).
+    Unlike check_proximity_batch(), which measures every point against the whole
+    catalog, each point is only paired with the few peaks of its grid cell, so the
+    cost doesn't grow with the catalog. Returns the same results as check_proximity().
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    results = [None] * len(points)
+    candidates, point_index, candidate_index = index.candidate_pairs(points[:, 0], points[:, 1])
+    if not candidates:
+        return results
+
+    arrays = mountain_arrays(candidates)
+    coords = np.radians(points)
+    distance = haversine(
+        coords[point_index, 0], coords[point_index, 1],
+        arrays.latitude[candidate_index], arrays.longitude[candidate_index],
+    )
+    near = distance <= arrays.radius[candidate_index] * (1 + HAVERSINE_MARGIN)
+    point_index, candidate_index, distance = point_index[near], candidate_index[near], distance[near]
+
+    # Same rule as check_proximity_batch(): a single candidate well inside its radius is
+    # certain; borderline or competing candidates go through geodesic() in cell order
+    counts = np.bincount(point_index, minlength=len(points))
+    runs = np.split(candidate_index, np.cumsum(counts)[:-1])
+    starts = np.cumsum(counts) - counts
+    for p in np.flatnonzero(counts).tolist():
+        run = runs[p].tolist()
+        if len(run) == 1 and distance[starts[p]] <= arrays.radius[run[0]] * (1 - HAVERSINE_MARGIN):
+            results[p] = candidates[run[0]]
+        else:
+            results[p] = nearest_match(tuple(points[p]), (candidates[c] for c in run))
+    return results
+
+def mountains_entered(points, mountains, point_index, mountain_index, arrays=None):
+    """
+    Batch check of a whole GPS track: which mountains have at least one of the
+    points inside their radius, and which point came first.
+    `points` is an (n, 2) array of (latitude, longitude) in track order, `mountains`
+    a sequence of mountains and `arrays` their optional mountain_arrays().
+    Only the (point, mountain) pairs given by the parallel arrays `point_index` and
+    `mountain_index` are tested (see MountainIndex.candidate_pairs); they must be
+    ordered by point.
+    Returns {position in `mountains`: index of the first point inside its radius}.
+    Unlike check_proximity_batch(), overlapping radii all count, not just the nearest.
+    """
+    mountains = list(mountains)
+    if not len(point_index) or not mountains:
+        return {}
+    if arrays is None:
+        arrays = mountain_arrays(mountains)
+
+    coords = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    distance = haversine(
+        coords[point_index, 0], coords[point_index, 1],
+        arrays.latitude[mountain_index], arrays.longitude[mountain_index],
+    )
+    radius = arrays.radius[mountain_index]
+
+    # First clearly-inside point per mountain; np.unique keeps the first occurrence
+    first = np.full(len(mountains), len(coords), dtype=np.intp)
+    certain = distance <= radius * (1 - HAVERSINE_MARGIN)
+    found, at = np.unique(mountain_index[certain], return_index=True)
+    first[found] = point_index[certain][at]
+
+    # Borderline pairs only matter before that point; confirm them with geodesic()
+    borderline = ~certain & (distance <= radius * (1 + HAVERSINE_MARGIN))
+    borderline &= point_index < first[mountain_index]
+    for i, j in zip(point_index[borderline].tolist(), mountain_index[borderline].tolist()):
+        if i < first[j]:
+            m = mountains[j]
+            if geodesic((m.latitude, m.longitude), tuple(points[i])).meters <= m.radius:
+                first[j] = i
+
+    return {j: int(first[j]) for j in np.flatnonzero(first < len(coords)).tolist()}
+
+# Catalog of a matching pool worker process, set once by init_match_worker()
+_worker_mountains = None
+_worker_arrays = None
+
+def init_match_worker(mountains):
+    """
+    ProcessPoolExecutor initializer for parallel matching (see mountains/rematch.py).
+    `mountains` is a sequence of (id, latitude, longitude, radius) tuples: plain data
+    and this Django-free module keep the workers importable under any start method.
+    """
+    global _worker_mountains, _worker_arrays
+    _worker_mountains = [SimpleNamespace(id=i, latitude=lat, longitude=lon, radius=radius)
+                         for i, lat, lon, radius in mountains]
+    _worker_arrays = mountain_arrays(_worker_mountains)
+
+def match_ids(points):
+    """
+    Runs in a worker: [(photo_id, lat, lon), ...] -> [(photo_id, mountain_id or None), ...]
+    """
+    matches = check_proximity_batch([(lat, lon) for _, lat, lon in points], _worker_mountains, _worker_arrays)
+    return [(photo_id, match.id if match else None) for (photo_id, _, _), match in zip(points, matches)]
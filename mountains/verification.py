@@ -0,0 +1,107 @@
+# mountains/verification.py
+import logging
+
+from django.db import transaction
+
+from .catalog import get_catalog
+from .metrics import stage
+from .models import Photo
+from .progress import bump_progress_version, record_visit
+from .utils import get_exif_data, check_proximity, nearest_mountains
+
+logger = logging.getLogger('mountains.verification')
+
+# Validation messages shown to the user (form errors and rejected photo cards)
+NO_GPS_MESSAGE = "This photo lacks GPS (EXIF) data. Please ensure location services were enabled on your camera."
+NO_MATCH_MESSAGE = "No match found! Your location ({lat:.4f}, {lon:.4f}) does not match any mountain peak in our database."
+NEAREST_PEAKS_MESSAGE = " Nearest peaks: {peaks}."
+NEAREST_PEAK = "{distance} from {name} (radius {radius} m)"
+# Peaks listed in a rejection, as many as fit in Photo.rejection_reason
+NEAREST_PEAKS_SHOWN = 3
+
+
+def format_distance(meters):
+    if meters < 1000:
+        return f"{meters:.0f} m"
+    return f"{meters / 1000:.1f} km" if meters < 10000 else f"{meters / 1000:.0f} km"
+
+
+def no_match_message(lat, lon, catalog=None):
+    """
+    Rejection message for a position no mountain's radius contains, listing the
+    nearest peaks so the user can tell a near miss from a wrong photo.
+    Also logs them, for tuning the radii.
+    """
+    catalog = catalog or get_catalog()
+    nearest = nearest_mountains(lat, lon, catalog.nearest, NEAREST_PEAKS_SHOWN)
+    logger.info(
+        "No match at (%.5f, %.5f); nearest: %s", lat, lon,
+        ", ".join(f"{m.name} (id {m.id}) {distance:.0f} m, radius {m.radius} m" for m, distance in nearest) or "none",
+    )
+
+    message = NO_MATCH_MESSAGE.format(lat=lat, lon=lon)
+    peaks = [NEAREST_PEAK.format(distance=format_distance(distance), name=m.name, radius=m.radius)
+             for m, distance in nearest]
+    max_length = Photo._meta.get_field('rejection_reason').max_length
+    while peaks:
+        full = message + NEAREST_PEAKS_MESSAGE.format(peaks=", ".join(peaks))
+        if len(full) <= max_length:
+            return full
+        peaks.pop()
+    return message
+
+
+def match_photo(lat, lon):
+    """
+    Checks photo coordinates against the cached catalog.
+    Returns (mountain record, None) on success or (None, rejection message).
+    """
+    if not lat or not lon:
+        return None, NO_GPS_MESSAGE
+
+    catalog = get_catalog()
+    found_mountain = check_proximity(lat, lon, catalog.index)
+    if not found_mountain:
+        return None, no_match_message(lat, lon, catalog)
+    return found_mountain, None
+
+
+def verify_photo_job(photo_id):
+    """
+    Background job (see mountains/jobs.py) run for every accepted upload:
+    reads the GPS position from the stored file, matches it and records the outcome.
+    Returns the badges (catalog BadgeRecords) the photo has unlocked, if any;
+    they are also announced through the progress.badges_unlocked signal.
+    """
+    photo = Photo.objects.filter(id=photo_id, status=Photo.Status.PENDING).first()
+    if photo is None:
+        # Deleted in the meantime, or already processed by an earlier attempt
+        return []
+
+    with stage('verify.exif'), photo.image.open('rb') as image_file:
+        lat, lon = get_exif_data(image_file)
+    with stage('verify.match'):
+        mountain, rejection = match_photo(lat, lon)
+
+    photo.latitude = lat
+    photo.longitude = lon
+    photo.matched_mountain_id = mountain.id if mountain else None
+    photo.status = Photo.Status.VERIFIED if mountain else Photo.Status.REJECTED
+    photo.rejection_reason = rejection or ''
+
+    # The photo and the user's visit/badge tables change together or not at all.
+    # The conditional UPDATE makes sure only one run counts the photo, even if a
+    # stale job lock let two workers pick it up.
+    with transaction.atomic():
+        updated = Photo.objects.filter(id=photo.id, status=Photo.Status.PENDING).update(
+            latitude=photo.latitude,
+            longitude=photo.longitude,
+            matched_mountain_id=photo.matched_mountain_id,
+            status=photo.status,
+            rejection_reason=photo.rejection_reason,
+        )
+        if updated:
+            transaction.on_commit(lambda: bump_progress_version(photo.user_id))
+        if updated and mountain:
+            return record_visit(photo)
+    return []
@@ -1,41 +1,153 @@
 # mountains/views.py
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .forms import PhotoUploadForm
-from .models import Photo, Mountain, Badge
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition
+from .catalog import get_catalog, get_catalog_version
+from .dedup import afind_own_duplicate, afind_shared_blob
+from .forms import PhotoUploadForm, TrackUploadForm
+from .jobs import enqueue
+from .leaderboard import BOARDS, badge_rank, top_badge_users, top_users, user_rank
+from .metrics import render_text, stage
+from .models import Photo, UserBadgeProgress, UserMountainVisit
+from .offload import run_image_work
+from .pagination import akeyset_page, keyset_page
+from .progress import get_progress_version
+from .storage import file_sha256
+from .upload_handlers import GpsPrecheckUploadHandler
 
+# Rendered profile bodies; superseded keys simply expire
+PROFILE_CACHE_KEY = 'mountains:profile:{user_id}:{progress}:{catalog}'
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+
+async def auth_user(request):
+    """
+    Loads the logged-in user without blocking the event loop and shares it with
+    request.user, which templates read (request.auser() caches it separately).
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+def read_upload(request):
+    # Reading the body runs the upload handlers, including the GPS pre-check
+    with stage('upload.receive'):
+        return request.POST, request.FILES
+
+def store_upload(photo):
+    # The file is stored before the transaction starts, which keeps the
+    # transaction short and tells storage and DB time apart in the metrics
+    with stage('upload.storage'):
+        photo.image.save(photo.image.name, photo.image.file, save=False)
+
+def insert_upload(photo):
+    """
+    INSERTs the photo together with its jobs, so a pending photo always has a job
+    that will process it. Runs through sync_to_async: transactions have no async API.
+    """
+    with stage('upload.db_insert'), transaction.atomic():
+        photo.save()
+        enqueue('mountains.verification.verify_photo_job', photo_id=photo.id)
+        if not (photo.thumbnail and photo.preview):
+            enqueue('mountains.renditions.generate_renditions_job', photo_id=photo.id)
+
+@csrf_exempt
 @login_required
-def upload_photo(request):
+async def upload_photo(request):
     """
     Handles the photo upload process.
+    Under ASGI the server receives the (possibly slow) request body without holding
+    a thread. Parsing it, hashing, validating and storing the image run in the
+    bounded image pool (see mountains/offload.py); queries use the async ORM.
+    The GPS pre-check handler has to be installed before anything reads request.POST,
+    which is why CSRF protection is applied on the inner view instead of by the middleware.
+    Under ASGI it runs on the already spooled body (a sync view would get the same),
+    so there it spares the image work but not the receiving of a rejected photo.
     """
+    await auth_user(request)
+    request.upload_handlers.insert(0, GpsPrecheckUploadHandler(request))
     if request.method == 'POST':
-        form = PhotoUploadForm(request.POST, request.FILES)
-        if form.is_valid():
+        # Parsed here, in the pool, before csrf_protect reads request.POST on the event loop
+        await run_image_work(read_upload, request)
+    return await _upload_photo(request)
+
+@csrf_protect
+async def _upload_photo(request):
+    if request.method == 'POST':
+        form = PhotoUploadForm(
+            request.POST, request.FILES,
+            # Set by GpsPrecheckUploadHandler if it rejected the photo mid-stream
+            upload_rejection=getattr(request, 'upload_rejection', None),
+        )
+        # Validating the image field opens and verifies it with Pillow
+        if await run_image_work(form.is_valid):
             # commit=False creates the object in memory but doesn't send to DB yet
             photo = form.save(commit=False)
             # Associate the photo with the currently logged-in user
             photo.user = request.user
-            # Final save triggers the Database INSERT
-            photo.save()
+
+            with stage('upload.dedup'):
+                photo.content_hash = (getattr(request, 'upload_sha256', None)
+                                      or await run_image_work(file_sha256, photo.image.file))
+                own_duplicate = await afind_own_duplicate(request.user, photo.content_hash)
+                shared = None if own_duplicate else await afind_shared_blob(photo.content_hash)
+            if own_duplicate:
+                # A retry of an earlier upload: nothing to store or verify again
+                messages.info(request, "To zdjęcie zostało już przesłane wcześniej.")
+                return redirect('profile')
+
+            if shared:
+                # Another user uploaded the same file: reference the stored blob
+                # and its renditions instead of writing them again
+                photo.image = shared['image']
+                photo.thumbnail = shared['thumbnail']
+                photo.preview = shared['preview']
+            else:
+                await run_image_work(store_upload, photo)
+            await sync_to_async(insert_upload)(photo)
+            messages.info(request, "Zdjęcie zostało przesłane i czeka na weryfikację.")
             return redirect('profile')
     else:
         form = PhotoUploadForm()
     return render(request, 'upload.html', {'form': form})
 
-def calculate_badge_stats(badge, visited_ids):
+@login_required
+def upload_track(request):
     """
-    Pure helper function to calculate progress for a specific badge.
-    Input: A Badge object, and a Set of mountain IDs the user has visited.
+    Uploads a GPS track (GPX or FIT). Like photo verification, reading and matching
+    its points happens in a background job (see mountains/tracks.py).
+    """
+    if request.method == 'POST':
+        form = TrackUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            track = form.save(commit=False)
+            track.user = request.user
+            with stage('track_upload.storage'):
+                track.file.save(track.file.name, track.file.file, save=False)
+            with stage('track_upload.db_insert'), transaction.atomic():
+                track.save()
+                enqueue('mountains.tracks.process_track_job', track_id=track.id)
+            messages.info(request, "Trasa została przesłana. Zdobyte szczyty pojawią się po jej przetworzeniu.")
+            return redirect('profile')
+    else:
+        form = TrackUploadForm()
+    return render(request, 'upload_track.html', {'form': form})
+
+def calculate_badge_stats(badge, current_progress, total_required):
+    """
+    Pure helper function to format the progress of a specific badge.
+    Input: A catalog BadgeRecord, how many of its mountains the user has visited
+    and how many it requires (see BadgeRequirementIndex.progress).
     """
-    # Get IDs of all mountains required for this badge
-    required_ids = set(badge.mountains.values_list('id', flat=True))
-    total_required = len(required_ids)
-    
-    # Calculate intersection: Mountains required AND visited
-    visited_in_badge = required_ids.intersection(visited_ids)
-    current_progress = len(visited_in_badge)
-    
     return {
         'obj': badge,
         # Badge is unlocked if progress equals requirement (and requirement isn't empty)
@@ -45,34 +157,260 @@ def calculate_badge_stats(badge, visited_ids):
         'percent': int((current_progress / total_required) * 100) if total_required > 0 else 0
     }
 
-@login_required
-def profile(request):
+async def aannounce_unlocked_badges(request, user):
     """
-    User profile view. 
-    Aggregates photo history and calculates badge progress using Set operations.
+    Shows a message for every badge unlocked but not yet announced to the user,
+    then marks them as seen.
     """
-    user_photos = Photo.objects.filter(user=request.user).order_by('-uploaded_at')
-    
-    # 1. Functional extraction of visited IDs
-    # We create a Set of IDs to make subsequent lookups O(1) instead of O(N)
-    visited_ids = set(user_photos.filter(matched_mountain__isnull=False)
-                                 .values_list('matched_mountain__id', flat=True))
-    
-    # Retrieve actual mountain objects for the list view
-    visited_mountains = Mountain.objects.filter(id__in=visited_ids).distinct()
-    all_mountains_count = Mountain.objects.count()
+    unseen = UserBadgeProgress.objects.filter(user=user, unlocked_at__isnull=False, unlock_seen=False)
+    badge_ids = [badge_id async for badge_id in unseen.order_by('unlocked_at').values_list('badge_id', flat=True)]
+    if not badge_ids:
+        return
+    catalog = await sync_to_async(get_catalog)()
+    badges = {badge.id: badge for badge in catalog.badges}
+    for badge_id in badge_ids:
+        if badge_id in badges:
+            messages.success(request, f"Nowa odznaka: {badges[badge_id].name}!")
+    await unseen.filter(badge_id__in=badge_ids).aupdate(unlock_seen=True)
 
-    # 2. Functional Badge Progress
-    # prefetch_related reduces database queries (solving the N+1 problem)
-    all_badges = Badge.objects.prefetch_related('mountains').all()
+async def aprofile_context(user):
+    """
+    Everything profile_content.html needs.
+    Visits are read from the per-user table maintained by mountains/progress.py,
+    so no aggregation over Photo rows happens here.
+    """
+    user_photos = Photo.objects.filter(user=user)
+    # Only the first page of the history is rendered here; the rest is fetched
+    # from photo_history as the user scrolls.
+    history = await akeyset_page(user_photos.select_related('matched_mountain'))
+    photo_counts = await user_photos.aaggregate(
+        total=Count('id'), pending=Count('id', filter=Q(status=Photo.Status.PENDING))
+    )
+
+    # 1. Visited mountains, most recently conquered first (one indexed read)
+    visited_ids = [mountain_id async for mountain_id in
+                   UserMountainVisit.objects.filter(user=user)
+                                            .order_by('-first_visited_at')
+                                            .values_list('mountain_id', flat=True)]
     
-    # List comprehension maps the calculation function over all badges
-    badges_status = [calculate_badge_stats(badge, visited_ids) for badge in all_badges]
+    # Mountains and badges come from the cached catalog snapshot instead of the DB.
+    # (Its version lives in the cache and a reload queries the DB, hence the thread.)
+    catalog = await sync_to_async(get_catalog)()
+
+    # Retrieve the mountain records for the list view
+    visited_mountains = [catalog.mountains_by_id[i] for i in visited_ids
+                         if i in catalog.mountains_by_id]
+
+    # 2. Badge Progress
+    # A single pass of bitset operations over the catalog's badge requirement index;
+    # the query count stays constant no matter how many badges exist.
+    badges_status = [calculate_badge_stats(badge, current, total)
+                     for badge, current, total in catalog.badge_index.progress(visited_ids)]
 
-    context = {
-        'photos': user_photos,
+    return {
+        'photos': history.items,
+        'next_cursor': history.next_cursor,
+        'photo_count': photo_counts['total'],
+        'pending_count': photo_counts['pending'],
         'visited_mountains': visited_mountains,
-        'progress': f"{len(visited_ids)} / {all_mountains_count}",
+        'progress': f"{len(visited_ids)} / {len(catalog)}",
         'badges_status': badges_status,
     }
-    return render(request, 'profile.html', context)
\ No newline at end of file
+
+def profile_cache_key(user_id):
+    # Versions are read before the data, so a concurrent change can only make
+    # the cached body newer than its key, never older.
+    return PROFILE_CACHE_KEY.format(
+        user_id=user_id,
+        progress=get_progress_version(user_id),
+        catalog=get_catalog_version(),
+    )
+
+def render_profile_content(request, context):
+    # Rendered in a thread: the template touches model instances, which must not
+    # lazily query from the event loop
+    with stage('profile.render'):
+        return render_to_string('profile_content.html', context, request=request)
+
+@login_required
+async def profile(request):
+    """
+    User profile view. 
+    The rendered body is cached under the user's progress version and the catalog
+    version. Both are bumped whenever something shown on the page changes, so a
+    cached body is never stale and repeat views skip the queries and the rendering.
+    """
+    user = await auth_user(request)
+    with stage('profile.cache_lookup'):
+        key = await sync_to_async(profile_cache_key)(user.id)
+        content = await cache.aget(key)
+    if content is None:
+        # Unlocks come from the verification job, which also bumps the progress
+        # version, so new badges are always announced on a cache miss.
+        # Announced once; the timestamps themselves stay in UserBadgeProgress.
+        await aannounce_unlocked_badges(request, user)
+        with stage('profile.query'):
+            context = await aprofile_context(user)
+        content = await sync_to_async(render_profile_content)(request, context)
+        await cache.aset(key, content, PROFILE_CACHE_TIMEOUT)
+    # The rank also moves when other users climb, so it stays out of the cached body;
+    # it costs two indexed reads (see mountains/leaderboard.py)
+    with stage('profile.rank'):
+        rank, peak_count = await sync_to_async(user_rank)(user.id)
+    return render(request, 'profile.html', {'content': mark_safe(content), 'rank': rank, 'peak_count': peak_count})
+
+@login_required
+def leaderboard(request):
+    """
+    Global rankings (?board=peaks or badges) and per-badge rankings (?badge=<id>),
+    with the logged-in user's own place even when it's outside the top list.
+    """
+    catalog = get_catalog()
+    badges = {badge.id: badge for badge in catalog.badges}
+    badge = None
+    if request.GET.get('badge'):
+        try:
+            badge = badges[int(request.GET['badge'])]
+        except (ValueError, KeyError):
+            return HttpResponseBadRequest("Unknown badge.")
+        rows = top_badge_users(badge.id)
+        rank, score = badge_rank(request.user.id, badge.id)
+        board = 'badge'
+    else:
+        board = request.GET.get('board', 'peaks')
+        if board not in BOARDS:
+            return HttpResponseBadRequest("Unknown ranking.")
+        rows = top_users(board)
+        rank, score = user_rank(request.user.id, board)
+
+    return render(request, 'leaderboard.html', {
+        'rows': rows,
+        'board': board,
+        'badge': badge,
+        'badges': catalog.badges,
+        'rank': rank,
+        'score': score,
+    })
+
+def photo_as_dict(photo):
+    return {
+        'id': photo.id,
+        'image_url': photo.image.url,
+        'thumbnail_url': photo.thumbnail.url if photo.thumbnail else None,
+        'preview_url': photo.preview.url if photo.preview else None,
+        'uploaded_at': photo.uploaded_at.isoformat(),
+        'status': photo.status,
+        'mountain': photo.matched_mountain.name if photo.matched_mountain else None,
+        'latitude': photo.latitude,
+        'longitude': photo.longitude,
+        'rejection_reason': photo.rejection_reason,
+    }
+
+@login_required
+def photo_history(request):
+    """
+    One page of the user's photos, newest first, starting after ?cursor=.
+    Returns the HTML fragment appended by the profile page, or JSON with ?format=json.
+    """
+    try:
+        page = keyset_page(
+            Photo.objects.filter(user=request.user).select_related('matched_mountain'),
+            cursor=request.GET.get('cursor'),
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'photos': [photo_as_dict(photo) for photo in page.items],
+            'next_cursor': page.next_cursor,
+        })
+    return render(request, 'photo_cards.html', {'photos': page.items, 'next_cursor': page.next_cursor})
+
+# MAP DATA (GeoJSON)
+# Both endpoints are conditional: the ETag is derived from the same versions as the
+# profile cache, so `condition` answers If-None-Match with a 304 before any query runs.
+
+def mountain_feature(mountain, **properties):
+    return {
+        'type': 'Feature',
+        # GeoJSON orders coordinates as [longitude, latitude]
+        'geometry': {'type': 'Point', 'coordinates': [mountain.longitude, mountain.latitude]},
+        'properties': {'id': mountain.id, 'name': mountain.name, 'altitude': mountain.altitude, **properties},
+    }
+
+def geojson_response(features):
+    response = JsonResponse({'type': 'FeatureCollection', 'features': features},
+                            content_type='application/geo+json')
+    # Always revalidate; thanks to the ETag that is a cheap 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def parse_bbox(value):
+    """
+    Parses "min_lon,min_lat,max_lon,max_lat" into a tuple of floats, or raises ValueError.
+    min_lon > max_lon describes a box crossing the antimeridian.
+    """
+    bbox = tuple(float(part) for part in value.split(','))
+    if len(bbox) != 4:
+        raise ValueError("bbox needs 4 numbers")
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox out of range")
+    return bbox
+
+def in_bbox(mountain, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if not min_lat <= mountain.latitude <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= mountain.longitude <= max_lon
+    return mountain.longitude >= min_lon or mountain.longitude <= max_lon
+
+def visited_peaks_etag(request):
+    return f"visited-{get_progress_version(request.user.id)}-{get_catalog_version()}"
+
+@login_required
+@condition(etag_func=visited_peaks_etag)
+def visited_peaks_geojson(request):
+    """
+    The user's visited peaks as a GeoJSON FeatureCollection (drawn on the profile map).
+    """
+    catalog = get_catalog()
+    visits = UserMountainVisit.objects.filter(user=request.user).order_by('-first_visited_at')
+    features = [
+        mountain_feature(catalog.mountains_by_id[mountain_id], first_visited_at=first_visited_at.isoformat())
+        for mountain_id, first_visited_at in visits.values_list('mountain_id', 'first_visited_at')
+        if mountain_id in catalog.mountains_by_id
+    ]
+    return geojson_response(features)
+
+def catalog_peaks_etag(request):
+    # The bbox is part of the URL, so the catalog version alone identifies the response
+    return f"catalog-{get_catalog_version()}"
+
+@login_required
+@condition(etag_func=catalog_peaks_etag)
+def catalog_peaks_geojson(request):
+    """
+    All catalog peaks as GeoJSON, optionally clipped to ?bbox=min_lon,min_lat,max_lon,max_lat.
+    Served from the catalog snapshot, without touching the database.
+    """
+    mountains = get_catalog().mountains
+    if 'bbox' in request.GET:
+        try:
+            bbox = parse_bbox(request.GET['bbox'])
+        except ValueError:
+            return HttpResponseBadRequest("Invalid bbox.")
+        mountains = [m for m in mountains if in_bbox(m, bbox)]
+    return geojson_response([mountain_feature(m) for m in mountains])
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint with the metrics of this process (see mountains/metrics.py).
+    Open to staff users and to the addresses in settings.METRICS_ALLOWED_IPS (none by default).
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if request.META.get('REMOTE_ADDR') not in allowed and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')